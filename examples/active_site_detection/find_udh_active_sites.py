@@ -17,32 +17,325 @@ Date: 2025-11-20
 
 import os
 import sys
+import io
 import argparse
+import contextlib
+import fnmatch
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator
 import subprocess
+import zipfile
 
 # Fix Windows console encoding for Unicode characters
 if sys.platform == 'win32':
-    import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 try:
-    from Bio.PDB import PDBParser, Superimposer, PDBIO, Selection
-    from Bio.PDB.Chain import Chain
-    from Bio.PDB.Residue import Residue
+    from Bio.Align import PairwiseAligner
     import numpy as np
 except ImportError:
     print("Error: BioPython is required. Install with: pip install biopython")
     sys.exit(1)
 
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # without SciPy, fall back to a full distance matrix
+    cKDTree = None
+
+try:
+    import gemmi
+except ImportError:  # without gemmi, parse fixed PDB columns with NumPy
+    gemmi = None
+
+MIN_PAIRED_ATOMS = 3  # fewer sequence-aligned pairs than this falls back to file order
+
+THREE_TO_ONE = {
+    'ALA': 'A', 'ARG': 'R', 'ASN': 'N', 'ASP': 'D', 'CYS': 'C',
+    'GLN': 'Q', 'GLU': 'E', 'GLY': 'G', 'HIS': 'H', 'ILE': 'I',
+    'LEU': 'L', 'LYS': 'K', 'MET': 'M', 'PHE': 'F', 'PRO': 'P',
+    'SER': 'S', 'THR': 'T', 'TRP': 'W', 'TYR': 'Y', 'VAL': 'V',
+}
+
+# Global alignment scored like pairwise2.align.globalxx (match 1, no penalties)
+ALIGNER = PairwiseAligner()
+ALIGNER.mode = 'global'
+ALIGNER.match_score = 1
+ALIGNER.mismatch_score = 0
+ALIGNER.gap_score = 0
+
+
+@dataclass
+class CAView:
+    """CA atoms of one chain as parallel arrays (structure of arrays)"""
+    res_nums: np.ndarray   # (N,) residue numbers
+    res_names: np.ndarray  # (N,) three-letter residue names
+    coords: np.ndarray     # (N, 3) CA coordinates
+
+    def __len__(self) -> int:
+        return len(self.res_nums)
+
+    def select(self, mask: np.ndarray) -> 'CAView':
+        """Return the residues where mask is True (or at the given indices)"""
+        return CAView(self.res_nums[mask], self.res_names[mask], self.coords[mask])
+
+    @classmethod
+    def empty(cls) -> 'CAView':
+        return cls(np.empty(0, dtype=int), np.empty(0, dtype='<U3'),
+                   np.empty((0, 3), dtype=np.float32))
+
+    def sequence(self) -> str:
+        """One-letter sequence of the residues ('X' for non-standard names)"""
+        return ''.join(THREE_TO_ONE.get(name, 'X') for name in self.res_names)
+
+
+def read_ca_atoms(pdb_file: str) -> Dict[str, CAView]:
+    """
+    Read CA atoms of standard residues for every chain of the first model
+
+    Parsing uses gemmi (C++) when it is installed and a NumPy fixed-column
+    reader otherwise.
+
+    Args:
+        pdb_file: Path to PDB file
+
+    Returns:
+        Dict of chain_id -> CAView with float32 coordinates, in file order
+    """
+    if gemmi is None:
+        return _read_ca_atoms_columns(pdb_file)
+
+    chains = {}
+    structure = gemmi.read_structure(str(pdb_file))
+    models = [structure[0]] if len(structure) > 0 else []
+    for model in models:
+        for chain in model:
+            res_nums, res_names, coords = chains.setdefault(chain.name, ([], [], []))
+            for residue in chain:
+                # Skip hetero atoms (water, ligands, etc.)
+                if residue.het_flag != 'A':
+                    continue
+                ca = residue.find_atom('CA', '*')
+                if ca is not None:
+                    res_nums.append(residue.seqid.num)
+                    res_names.append(residue.name)
+                    coords.append((ca.pos.x, ca.pos.y, ca.pos.z))
+
+    return {chain_id: CAView(np.array(res_nums, dtype=int), np.array(res_names, dtype='<U3'),
+                             np.array(coords, dtype=np.float32).reshape(-1, 3))
+            for chain_id, (res_nums, res_names, coords) in chains.items()}
+
+
+def _read_ca_atoms_columns(pdb_file: str) -> Dict[str, CAView]:
+    """
+    NumPy fixed-column reader behind read_ca_atoms (used without gemmi)
+
+    Follows BioPython's PDBParser conventions: every chain of the first
+    model is listed (also those without CA atoms), only ATOM records count
+    as standard residues, and of alternate CA locations the one with the
+    highest occupancy (first on ties) is kept.
+
+    Args:
+        pdb_file: Path to PDB file
+
+    Returns:
+        Dict of chain_id -> CAView with float32 coordinates, in file order
+    """
+    data = Path(pdb_file).read_bytes()
+    end_model = data.find(b'\nENDMDL')
+    if end_model >= 0:
+        data = data[:end_model]
+
+    # Fixed-width columns of every coordinate record, up to the occupancy
+    lines = [line[:60].ljust(60) for line in data.splitlines()
+             if line.startswith((b'ATOM  ', b'HETATM'))]
+    if not lines:
+        return {}
+    cols = np.frombuffer(b''.join(lines), dtype=np.uint8).reshape(len(lines), 60)
+
+    # Chains in order of first appearance, including ones without CA atoms
+    chain_col = cols[:, 21]
+    _, first_seen = np.unique(chain_col, return_index=True)
+    chain_order = [chr(chain_col[i]) for i in np.sort(first_seen)]
+
+    atom_names = np.char.strip(np.ascontiguousarray(cols[:, 12:16]).view('S4').ravel())
+    ca_rows = np.flatnonzero((cols[:, 0] == ord('A')) & (atom_names == b'CA'))
+    res_keys = np.ascontiguousarray(cols[ca_rows, 21:27]).view('S6').ravel()
+    occupancies = np.char.strip(np.ascontiguousarray(cols[ca_rows, 54:60]).view('S6').ravel())
+
+    # (chain, resseq, icode) -> row of the selected CA, in order of appearance
+    selected = {}
+    best_occ = {}
+    for row, key, occ in zip(ca_rows.tolist(), res_keys.tolist(), occupancies.tolist()):
+        occ = float(occ or 0)
+        if key not in selected or occ > best_occ[key]:
+            selected[key] = row
+            best_occ[key] = occ
+
+    rows = np.fromiter(selected.values(), dtype=np.intp, count=len(selected))
+    ca_cols = cols[rows]
+    ca_chains = np.array([chr(c) for c in ca_cols[:, 21]], dtype='<U1')
+    res_nums = np.ascontiguousarray(ca_cols[:, 22:26]).view('S4').ravel().astype(int)
+    res_names = np.char.strip(np.ascontiguousarray(ca_cols[:, 17:20]).view('S3').ravel()).astype('<U3')
+    coords = (np.ascontiguousarray(ca_cols[:, 30:54]).view('S8')
+              .astype(np.float64).astype(np.float32).reshape(-1, 3))
+
+    result = {}
+    for chain_id in chain_order:
+        mask = ca_chains == chain_id
+        result[chain_id] = CAView(res_nums[mask], res_names[mask], coords[mask])
+    return result
+
+
+def load_ca_atoms(pdb_file: str, cache_dir: Optional[str] = None) -> Dict[str, CAView]:
+    """
+    Read CA atoms through an optional on-disk cache
+
+    Cache entries are .npz files keyed by the resolved path, size and
+    modification time of the PDB file, so an edited file is re-parsed.
+
+    Args:
+        pdb_file: Path to PDB file
+        cache_dir: Cache directory (None disables caching)
+
+    Returns:
+        Dict of chain_id -> CAView, as returned by read_ca_atoms
+    """
+    if cache_dir is None:
+        return read_ca_atoms(pdb_file)
+
+    stat = os.stat(pdb_file)
+    key = f"{Path(pdb_file).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    cache_file = Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()}.npz"
+
+    try:
+        # NpzFile re-reads a member from the archive on every access, so read each once
+        with np.load(cache_file) as data:
+            chain_ids, bounds = data['chain_ids'], data['offsets']
+            res_nums, res_names, coords = data['res_nums'], data['res_names'], data['coords']
+        return {str(chain_id): CAView(res_nums[start:end], res_names[start:end], coords[start:end])
+                for chain_id, start, end in zip(chain_ids, bounds[:-1], bounds[1:])}
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass  # missing or unreadable entry: parse and (re)write it
+
+    chains = read_ca_atoms(pdb_file)
+    views = list(chains.values()) or [CAView.empty()]
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_file, 'wb') as f:
+        np.savez(f,
+                 chain_ids=np.array(list(chains), dtype=str),
+                 offsets=np.cumsum([0] + [len(view) for view in chains.values()]),
+                 res_nums=np.concatenate([view.res_nums for view in views]),
+                 res_names=np.concatenate([view.res_names for view in views]),
+                 coords=np.concatenate([view.coords for view in views]))
+    os.replace(tmp_file, cache_file)
+    return chains
+
+
+def iter_target_files(target_dir: str, pattern: str) -> Iterator[Path]:
+    """
+    Yield files in target_dir matching pattern, in directory order
+
+    Args:
+        target_dir: Directory containing target PDB files
+        pattern: Glob pattern; patterns with a path separator or '**' are
+            matched relative to target_dir
+
+    Returns:
+        Iterator of matching file paths
+    """
+    if '**' in pattern or '/' in pattern or os.sep in pattern:
+        # fnmatch only sees bare entry names, so let Path.glob walk subdirectories
+        yield from (path for path in Path(target_dir).glob(pattern) if path.is_file())
+        return
+
+    # One os.scandir pass over the directory (cheaper than Path.glob on large dirs)
+    with os.scandir(target_dir) as entries:
+        for entry in entries:
+            if fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+                yield Path(entry.path)
+
+
+def apply_transform(coords: np.ndarray, rot: np.ndarray, tran: np.ndarray) -> np.ndarray:
+    """
+    Apply a rigid transform in BioPython's row-vector convention
+
+    Args:
+        coords: (N, 3) coordinates
+        rot: (3, 3) rotation matrix
+        tran: (3,) translation vector
+
+    Returns:
+        Transformed (N, 3) float64 coordinates, i.e. ``coords @ rot + tran``
+    """
+    return np.asarray(coords, dtype=np.float64) @ rot + tran
+
+
+def sequence_pairs(ref_seq: str, target_seq: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair residue indices of two chains through a global sequence alignment
+
+    Args:
+        ref_seq: Reference one-letter sequence
+        target_seq: Target one-letter sequence
+
+    Returns:
+        Tuple of (reference indices, target indices) of aligned columns
+    """
+    if not ref_seq or not target_seq:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    ref_blocks, target_blocks = ALIGNER.align(ref_seq, target_seq)[0].aligned
+    ref_idx = [np.arange(start, end) for start, end in ref_blocks]
+    target_idx = [np.arange(start, end) for start, end in target_blocks]
+    if not ref_idx:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    return np.concatenate(ref_idx), np.concatenate(target_idx)
+
+
+def kabsch(fixed: np.ndarray, moving: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Least-squares superposition of moving onto fixed (Kabsch algorithm)
+
+    Uses the row-vector convention of BioPython's Superimposer, i.e. the
+    superposed coordinates are ``moving @ rot + tran``.
+
+    Args:
+        fixed: (N, 3) reference coordinates
+        moving: (N, 3) coordinates to superpose
+
+    Returns:
+        Tuple of (rotation matrix, translation vector, RMSD after superposition)
+    """
+    fixed = np.asarray(fixed, dtype=np.float64)
+    moving = np.asarray(moving, dtype=np.float64)
+
+    fixed_center = fixed.mean(axis=0)
+    moving_center = moving.mean(axis=0)
+
+    # 3x3 covariance -> SVD; flip the last axis if the result would be a reflection
+    u, _, vt = np.linalg.svd((moving - moving_center).T @ (fixed - fixed_center))
+    rot = u @ vt
+    if np.linalg.det(rot) < 0:
+        vt[2] = -vt[2]
+        rot = u @ vt
+    tran = fixed_center - moving_center @ rot
+
+    diff = apply_transform(moving, rot, tran) - fixed
+    rmsd = float(np.sqrt((diff * diff).sum() / len(fixed)))
+    return rot, tran, rmsd
+
 
 class UDHActiveSiteFinder:
     """Find active sites in UDH structures using reference structure alignment"""
 
     def __init__(self, reference_pdb: str, reference_sites_file: str,
-                 distance_cutoff: float = 4.0):
+                 distance_cutoff: float = 4.0, cache_dir: Optional[str] = None):
         """
         Initialize the active site finder
 
@@ -50,18 +343,21 @@ class UDHActiveSiteFinder:
             reference_pdb: Path to reference AtUdh PDB file
             reference_sites_file: Path to file containing reference active site residues
             distance_cutoff: Distance cutoff (Angstroms) for identifying corresponding residues
+            cache_dir: Directory for cached CA coordinates (None disables caching)
         """
         self.reference_pdb = reference_pdb
         self.reference_sites_file = reference_sites_file
         self.distance_cutoff = distance_cutoff
-        self.parser = PDBParser(QUIET=True)
-
-        # Load reference structure
-        self.ref_structure = self.parser.get_structure("reference", reference_pdb)
+        self.cache_dir = cache_dir
 
         # Load reference active site information
         self.ref_chain, self.ref_residues = self.load_active_sites(reference_sites_file)
 
+        # Load reference CA atoms once; the reference never moves
+        self.ref_ca = self.get_ca_atoms(load_ca_atoms(reference_pdb, cache_dir), self.ref_chain)
+        self.ref_active = self.ref_ca.select(np.isin(self.ref_ca.res_nums, self.ref_residues))
+        self.ref_seq = self.ref_ca.sequence()
+
     def load_active_sites(self, sites_file: str) -> Tuple[str, List[int]]:
         """
         Load active site residue information from file
@@ -88,42 +384,23 @@ class UDHActiveSiteFinder:
 
         raise ValueError(f"No valid active site definition found in {sites_file}")
 
-    def get_ca_atoms(self, structure, chain_id: str, residue_numbers: Optional[List[int]] = None):
+    def get_ca_atoms(self, chains: Dict[str, CAView], chain_id: str) -> CAView:
         """
-        Get CA atoms from specified residues
+        Get CA atoms of one chain
 
         Args:
-            structure: BioPython structure object
+            chains: Output of read_ca_atoms / load_ca_atoms
             chain_id: Chain identifier
-            residue_numbers: List of residue numbers (None = all residues)
 
         Returns:
-            List of CA atoms
+            CAView of the chain (empty if the chain is missing)
         """
-        atoms = []
-        try:
-            chain = structure[0][chain_id]
-            for residue in chain:
-                # Skip hetero atoms (water, ligands, etc.)
-                if residue.id[0] != ' ':
-                    continue
-
-                res_num = residue.id[1]
-
-                # Filter by residue numbers if specified
-                if residue_numbers is not None and res_num not in residue_numbers:
-                    continue
-
-                # Get CA atom
-                if 'CA' in residue:
-                    atoms.append(residue['CA'])
-
-        except KeyError as e:
+        if chain_id not in chains:
             print(f"Warning: Chain {chain_id} not found or incomplete")
+            return CAView.empty()
+        return chains[chain_id]
 
-        return atoms
-
-    def align_structures(self, target_pdb: str, target_chain: str = None) -> Tuple[object, str, float]:
+    def align_structures(self, target_pdb: str, target_chain: str = None) -> Tuple[CAView, str, float]:
         """
         Align target structure to reference structure
 
@@ -132,96 +409,85 @@ class UDHActiveSiteFinder:
             target_chain: Target chain ID (auto-detect if None)
 
         Returns:
-            Tuple of (aligned target structure, chain_id, rmsd)
+            Tuple of (aligned target CAView, chain_id, rmsd)
         """
         # Load target structure
-        target_structure = self.parser.get_structure("target", target_pdb)
+        target_chains = load_ca_atoms(target_pdb, self.cache_dir)
 
         # Auto-detect chain if not specified
         if target_chain is None:
-            chains = list(target_structure[0].get_chains())
-            if len(chains) == 0:
+            if len(target_chains) == 0:
                 raise ValueError(f"No chains found in {target_pdb}")
-            target_chain = chains[0].id
+            target_chain = next(iter(target_chains))
             print(f"Auto-detected chain: {target_chain}")
 
         # Get CA atoms for alignment (use all residues for global alignment)
-        ref_ca_atoms = self.get_ca_atoms(self.ref_structure, self.ref_chain)
-        target_ca_atoms = self.get_ca_atoms(target_structure, target_chain)
+        target_ca = self.get_ca_atoms(target_chains, target_chain)
+        ref_coords = self.ref_ca.coords
 
-        if len(ref_ca_atoms) == 0 or len(target_ca_atoms) == 0:
+        if len(ref_coords) == 0 or len(target_ca) == 0:
             raise ValueError("No CA atoms found for alignment")
 
-        # For alignment, use minimum number of atoms
-        n_atoms = min(len(ref_ca_atoms), len(target_ca_atoms))
-        ref_ca_atoms = ref_ca_atoms[:n_atoms]
-        target_ca_atoms = target_ca_atoms[:n_atoms]
+        # Pair CA atoms through a sequence alignment so that insertions and
+        # different numbering do not shift the pairing; fall back to file order
+        ref_idx, target_idx = sequence_pairs(self.ref_seq, target_ca.sequence())
+        if len(ref_idx) < MIN_PAIRED_ATOMS:
+            n_atoms = min(len(ref_coords), len(target_ca))
+            ref_idx = target_idx = np.arange(n_atoms)
 
-        print(f"Aligning {n_atoms} CA atoms...")
+        print(f"Aligning {len(ref_idx)} CA atoms...")
 
-        # Perform superposition
-        super_imposer = Superimposer()
-        super_imposer.set_atoms(ref_ca_atoms, target_ca_atoms)
+        # Perform superposition on the coordinate arrays
+        rot, tran, rmsd = kabsch(ref_coords[ref_idx], target_ca.coords[target_idx])
 
-        # Apply transformation to entire target structure
-        super_imposer.apply(target_structure.get_atoms())
+        # Only the CA coordinates are needed downstream, so only they are moved
+        aligned_ca = CAView(target_ca.res_nums, target_ca.res_names,
+                            apply_transform(target_ca.coords, rot, tran))
 
-        rmsd = super_imposer.rms
         print(f"Alignment RMSD: {rmsd:.2f} Å")
 
-        return target_structure, target_chain, rmsd
+        return aligned_ca, target_chain, rmsd
 
-    def find_corresponding_residues(self, target_structure, target_chain: str) -> List[Tuple[int, str, float]]:
+    def find_corresponding_residues(self, target_ca: CAView) -> List[Tuple[int, str, float]]:
         """
         Find residues in target structure corresponding to reference active sites
 
         Args:
-            target_structure: Aligned target structure
-            target_chain: Target chain ID
+            target_ca: Aligned target CA atoms
 
         Returns:
             List of tuples (residue_number, residue_name, min_distance)
         """
-        # Get reference active site CA atoms
-        ref_active_atoms = self.get_ca_atoms(self.ref_structure, self.ref_chain, self.ref_residues)
-
-        if len(ref_active_atoms) == 0:
+        if len(self.ref_active) == 0:
             raise ValueError("No active site atoms found in reference")
 
-        # Get all target residues
-        target_chain_obj = target_structure[0][target_chain]
-
         corresponding_residues = []
-
-        for ref_atom in ref_active_atoms:
-            ref_coord = ref_atom.get_coord()
-            ref_res = ref_atom.get_parent()
-
-            min_dist = float('inf')
-            closest_residue = None
-
-            # Find closest residue in target
-            for target_res in target_chain_obj:
-                # Skip hetero residues
-                if target_res.id[0] != ' ':
-                    continue
-
-                if 'CA' not in target_res:
-                    continue
-
-                target_coord = target_res['CA'].get_coord()
-                dist = np.linalg.norm(ref_coord - target_coord)
-
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_residue = target_res
-
-            if closest_residue and min_dist <= self.distance_cutoff:
-                res_num = closest_residue.id[1]
-                res_name = closest_residue.get_resname()
-                corresponding_residues.append((res_num, res_name, min_dist))
-                print(f"  Reference {ref_res.get_resname()}{ref_res.id[1]} -> "
-                      f"Target {res_name}{res_num} (distance: {min_dist:.2f} Å)")
+        if len(target_ca) == 0:
+            return corresponding_residues
+
+        ref_coords = self.ref_active.coords
+        target_coords = target_ca.coords
+
+        if cKDTree is not None:
+            # k-d tree nearest neighbour; anything beyond the cutoff comes back as inf
+            min_dists, nearest = cKDTree(target_coords).query(
+                ref_coords, distance_upper_bound=np.nextafter(self.distance_cutoff, np.inf))
+        else:
+            # Squared distances from every reference active-site CA to every target CA;
+            # the square root is only taken for the nearest one per row
+            diff = ref_coords[:, None, :] - target_coords[None, :, :]
+            dist_sq = np.einsum('ijk,ijk->ij', diff, diff)
+            nearest = dist_sq.argmin(axis=1)
+            min_dists = np.sqrt(dist_sq[np.arange(len(nearest)), nearest])
+
+        # Only reference sites whose closest target CA lies within the cutoff
+        for i in np.flatnonzero(min_dists <= self.distance_cutoff):
+            min_dist = min_dists[i]
+            res_num = int(target_ca.res_nums[nearest[i]])
+            res_name = str(target_ca.res_names[nearest[i]])
+            corresponding_residues.append((res_num, res_name, min_dist))
+            print(f"  Reference {self.ref_active.res_names[i]}{self.ref_active.res_nums[i]} -> "
+                  f"Target {res_name}{res_num} (distance: {min_dist:.2f} Å)")
 
         return corresponding_residues
 
@@ -243,36 +509,40 @@ class UDHActiveSiteFinder:
         print(f"{'='*60}")
 
         # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
 
         # Align structures
-        aligned_structure, chain_id, rmsd = self.align_structures(target_pdb, target_chain)
+        aligned_ca, chain_id, rmsd = self.align_structures(target_pdb, target_chain)
 
         # Find corresponding residues
         print(f"\nFinding active sites (cutoff: {self.distance_cutoff} Å)...")
-        corresponding = self.find_corresponding_residues(aligned_structure, chain_id)
+        corresponding = self.find_corresponding_residues(aligned_ca)
 
         # Save results
-        target_name = Path(target_pdb).stem
-        output_file = os.path.join(output_dir, f"{target_name}_active_sites.txt")
-
+        target_path = Path(target_pdb)
+        target_name = target_path.stem
+        output_file = str(Path(output_dir) / f"{target_name}_active_sites.txt")
+
+        residue_numbers = [str(r[0]) for r in corresponding]
+        lines = [
+            f"# Active sites found in {target_name}",
+            f"# Reference: {Path(self.reference_pdb).name}",
+            f"# Alignment RMSD: {rmsd:.2f} Å",
+            f"# Distance cutoff: {self.distance_cutoff} Å",
+            f"# Chain: {chain_id}",
+            "#",
+            "# Format: PDB_file[TAB]Chain[TAB]Residue_numbers",
+            "#",
+            f"{target_path.name}\t{chain_id}\t{','.join(residue_numbers)}",
+            "",
+            "# Detailed residue information:",
+            "# ResNum\tResName\tDistance(Å)",
+        ]
+        lines.extend(f"# {res_num}\t{res_name}\t{dist:.2f}" for res_num, res_name, dist in corresponding)
+
+        # Build the whole file in memory and write it once
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(f"# Active sites found in {target_name}\n")
-            f.write(f"# Reference: {os.path.basename(self.reference_pdb)}\n")
-            f.write(f"# Alignment RMSD: {rmsd:.2f} Å\n")
-            f.write(f"# Distance cutoff: {self.distance_cutoff} Å\n")
-            f.write(f"# Chain: {chain_id}\n")
-            f.write(f"#\n")
-            f.write(f"# Format: PDB_file[TAB]Chain[TAB]Residue_numbers\n")
-            f.write(f"#\n")
-
-            residue_numbers = [str(r[0]) for r in corresponding]
-            f.write(f"{os.path.basename(target_pdb)}\t{chain_id}\t{','.join(residue_numbers)}\n")
-
-            f.write(f"\n# Detailed residue information:\n")
-            f.write(f"# ResNum\tResName\tDistance(Å)\n")
-            for res_num, res_name, dist in corresponding:
-                f.write(f"# {res_num}\t{res_name}\t{dist:.2f}\n")
+            f.write('\n'.join(lines) + '\n')
 
         print(f"\nResults saved to: {output_file}")
         print(f"Found {len(corresponding)} active site residues")
@@ -286,35 +556,57 @@ class UDHActiveSiteFinder:
         }
 
     def process_multiple_targets(self, target_dir: str, output_dir: str = "results",
-                                pattern: str = "*.pdb") -> List[Dict]:
+                                pattern: str = "*.pdb", jobs: Optional[int] = None) -> List[Dict]:
         """
         Process multiple target structures
 
         Args:
             target_dir: Directory containing target PDB files
             output_dir: Output directory for results
-            pattern: File pattern to match (default: *.pdb)
+            pattern: Glob pattern to match (default: *.pdb); patterns with a
+                path separator or '**' are matched relative to target_dir
+            jobs: Worker processes (None uses every CPU, 1 processes serially)
 
         Returns:
-            List of result dictionaries
+            List of result dictionaries, sorted by target name
         """
-        target_path = Path(target_dir)
-        pdb_files = sorted(target_path.glob(pattern))
-
-        if not pdb_files:
+        # Targets are streamed straight from the directory listing; only the
+        # summary needs a stable order, so results are sorted afterwards
+        pdb_files = iter_target_files(target_dir, pattern)
+        first = next(pdb_files, None)
+        if first is None:
             print(f"No PDB files found in {target_dir} matching pattern {pattern}")
             return []
-
-        print(f"Found {len(pdb_files)} PDB files to process")
+        pdb_files = itertools.chain([first], pdb_files)
 
         results = []
-        for pdb_file in pdb_files:
-            try:
-                result = self.process_target(str(pdb_file), output_dir=output_dir)
-                results.append(result)
-            except Exception as e:
-                print(f"Error processing {pdb_file}: {e}")
-                continue
+        n_files = 0
+        n_workers = jobs or os.cpu_count() or 1
+
+        if n_workers > 1:
+            # Targets are independent: one process each, logs replayed in submission order.
+            # Workers receive this finder once, so the reference is never re-parsed.
+            target_jobs = ((str(pdb_file), output_dir) for pdb_file in pdb_files)
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(self,)) as executor:
+                # One target per task, so each log is printed as soon as it is next in order
+                for result, log in executor.map(_process_target_job, target_jobs, chunksize=1):
+                    n_files += 1
+                    print(log, end='')
+                    if result is not None:
+                        results.append(result)
+        else:
+            for pdb_file in pdb_files:
+                n_files += 1
+                try:
+                    result = self.process_target(str(pdb_file), output_dir=output_dir)
+                    results.append(result)
+                except Exception as e:
+                    print(f"Error processing {pdb_file}: {e}")
+                    continue
+
+        print(f"\nProcessed {n_files} PDB files")
+        results.sort(key=lambda result: result['target'])
 
         # Create summary file
         self.create_summary(results, output_dir)
@@ -323,31 +615,59 @@ class UDHActiveSiteFinder:
 
     def create_summary(self, results: List[Dict], output_dir: str):
         """Create summary file comparing all structures"""
-        summary_file = os.path.join(output_dir, "active_sites_comparison.tsv")
+        summary_file = Path(output_dir) / "active_sites_comparison.tsv"
+
+        # Header
+        lines = ["Structure\tChain\tRMSD(Å)\tN_Sites\tResidue_Positions\tResidue_Types"]
+
+        # Reference
+        ref_name = Path(self.reference_pdb).stem
+        ref_res_str = ','.join(map(str, self.ref_residues))
+        lines.append(f"{ref_name}\t{self.ref_chain}\t0.00\t{len(self.ref_residues)}\t{ref_res_str}\t-")
+
+        # Targets
+        for result in results:
+            sites = result['active_sites']
+            res_positions = ','.join(str(s[0]) for s in sites)
+            res_types = ','.join(s[1] for s in sites)
+            lines.append(f"{result['target']}\t{result['chain']}\t{result['rmsd']:.2f}\t"
+                         f"{len(sites)}\t{res_positions}\t{res_types}")
 
         with open(summary_file, 'w', encoding='utf-8') as f:
-            # Header
-            f.write("Structure\tChain\tRMSD(Å)\tN_Sites\tResidue_Positions\tResidue_Types\n")
+            f.write('\n'.join(lines) + '\n')
+
+        print(f"\nSummary saved to: {summary_file}")
 
-            # Reference
-            ref_name = Path(self.reference_pdb).stem
-            ref_res_str = ','.join(map(str, self.ref_residues))
-            f.write(f"{ref_name}\t{self.ref_chain}\t0.00\t{len(self.ref_residues)}\t{ref_res_str}\t-\n")
 
-            # Targets
-            for result in results:
-                target = result['target']
-                chain = result['chain']
-                rmsd = result['rmsd']
-                sites = result['active_sites']
-                n_sites = len(sites)
+# Finder shared by all jobs of a worker process (set by _init_worker)
+_WORKER_FINDER: Optional[UDHActiveSiteFinder] = None
 
-                res_positions = ','.join(str(s[0]) for s in sites)
-                res_types = ','.join(s[1] for s in sites)
 
-                f.write(f"{target}\t{chain}\t{rmsd:.2f}\t{n_sites}\t{res_positions}\t{res_types}\n")
+def _init_worker(finder: UDHActiveSiteFinder):
+    """Store the parent's finder (reference arrays already extracted) in this worker"""
+    global _WORKER_FINDER
+    _WORKER_FINDER = finder
 
-        print(f"\nSummary saved to: {summary_file}")
+
+def _process_target_job(job: Tuple) -> Tuple[Optional[Dict], str]:
+    """
+    Process one target in a worker process
+
+    Args:
+        job: (target_pdb, output_dir)
+
+    Returns:
+        Tuple of (result dictionary or None on error, captured console output)
+    """
+    target_pdb, output_dir = job
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            result = _WORKER_FINDER.process_target(target_pdb, output_dir=output_dir)
+        except Exception as e:
+            print(f"Error processing {target_pdb}: {e}")
+            result = None
+    return result, log.getvalue()
 
 
 def main():
@@ -391,6 +711,10 @@ Examples:
                        help='Distance cutoff in Angstroms (default: 4.0)')
     parser.add_argument('--pattern', default='*.pdb',
                        help='File pattern for target directory (default: *.pdb)')
+    parser.add_argument('--cache-dir',
+                       help='Cache parsed CA coordinates here to skip re-parsing on later runs')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                       help='Worker processes for --target-dir (default: CPU count; 1 = serial)')
 
     args = parser.parse_args()
 
@@ -408,11 +732,16 @@ Examples:
         parser.print_help()
         sys.exit(1)
 
+    if args.jobs is not None and args.jobs < 1:
+        print(f"Error: --jobs must be at least 1, got {args.jobs}")
+        sys.exit(1)
+
     # Initialize finder
     finder = UDHActiveSiteFinder(
         reference_pdb=args.reference,
         reference_sites_file=args.reference_sites,
-        distance_cutoff=args.cutoff
+        distance_cutoff=args.cutoff,
+        cache_dir=args.cache_dir
     )
 
     # Process target(s)
@@ -436,7 +765,8 @@ Examples:
         finder.process_multiple_targets(
             target_dir=args.target_dir,
             output_dir=args.output,
-            pattern=args.pattern
+            pattern=args.pattern,
+            jobs=args.jobs
         )
 
     print("\n" + "="*60)
@@ -2,13 +2,24 @@
 # -*- coding: utf-8 -*-
 """ASMC 실제 실행 및 결과 시각화"""
 
+import os
 import subprocess
 import sys
 from pathlib import Path
+import matplotlib
+if not sys.stdout.isatty():
+    matplotlib.use('Agg')  # 배치 실행(출력 리다이렉트)에서는 파일 출력 전용 backend 사용
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 import pandas as pd
 from datetime import datetime
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from scipy.cluster.hierarchy import dendrogram
+
+IDENTITY_BLOCK_BYTES = 16 * 1024 * 1024  # 비교 블록 크기 상한 (L3 캐시에 들어가도록)
+FIGURE_DPI = int(os.environ.get('ASMC_DPI', '150'))  # 출판용 그림은 ASMC_DPI=300으로 실행
+SINGLE_LINKAGE_MIN_SEQS = 5000  # 이보다 많으면 MST 기반 single linkage 사용
 
 def create_test_data():
     """테스트 데이터 생성"""
@@ -65,17 +76,18 @@ END
 """
     ]
 
-    # Create PDB files
+    # Create PDB files (written as bytes: no newline translation, same files on every OS)
     for i, pdb_content in enumerate(pdb_templates, 1):
         pdb_file = test_dir / f"protein{i}.pdb"
-        pdb_file.write_text(pdb_content, encoding='utf-8')
+        pdb_file.write_bytes(pdb_content.encode('ascii'))
+
+    # Absolute PDB paths, resolved against the cwd once for all list files
+    base = test_dir.absolute()
+    pdb_paths = [str(base / f"protein{i}.pdb") for i in range(1, len(pdb_templates) + 1)]
 
     # Create references.txt
-    refs_content = "\n".join([
-        str((test_dir / f"protein{i}.pdb").absolute())
-        for i in range(1, 3)
-    ])
-    (test_dir / "references.txt").write_text(refs_content, encoding='utf-8')
+    refs_content = "\n".join(pdb_paths[:2])
+    (test_dir / "references.txt").write_bytes(refs_content.encode('utf-8'))
 
     # Create sequences.fasta with more variation
     fasta_content = """>Protein_1_alpha
@@ -98,27 +110,35 @@ LSEQVQEELLSSQVTQELRALMDETMKELKAYKSELEEQLTPVAGG
 AAALWAALLVTFLAGCQAKVEQAVETEPEPELRQQTEWQSGQRWELALGRFWDYLRWVQT
 LSEQVQEELLSSQVTQELRALMDETMKELKAYKSELEEQLTPVAGGG
 """
-    (test_dir / "sequences.fasta").write_text(fasta_content, encoding='utf-8')
+    (test_dir / "sequences.fasta").write_bytes(fasta_content.encode('utf-8'))
 
     # Create models.txt with correct tab-separated format
     models_lines = []
-    for i in range(1, 4):
-        pdb_path = (test_dir / f'protein{i}.pdb').absolute()
+    for pdb_path in pdb_paths:
         ref_name = 'protein1'
         models_lines.append(f"{pdb_path}\t{ref_name}")
     models_content = "\n".join(models_lines)
-    (test_dir / "models.txt").write_text(models_content, encoding='utf-8')
+    (test_dir / "models.txt").write_bytes(models_content.encode('utf-8'))
 
     # Create pocket.txt
     pocket_content = "\n".join([
-        f"{(test_dir / f'protein{i}.pdb').absolute()}\tA\t1,2"
-        for i in range(1, 3)
+        f"{pdb_path}\tA\t1,2"
+        for pdb_path in pdb_paths[:2]
     ])
-    (test_dir / "pocket.txt").write_text(pocket_content, encoding='utf-8')
+    (test_dir / "pocket.txt").write_bytes(pocket_content.encode('utf-8'))
 
-    print(f"Test data created in {test_dir.absolute()}")
+    print(f"Test data created in {base}")
     return test_dir
 
+def encode_sequences(sequences):
+    """서열을 0으로 패딩한 uint8 행렬과 길이 배열로 인코딩 (한 번 만들어 여러 분석에서 재사용)"""
+    seqs = list(sequences.values())
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+    encoded = np.zeros((len(seqs), lengths.max(initial=0)), dtype=np.uint8)
+    for i, seq in enumerate(seqs):
+        encoded[i, :lengths[i]] = np.frombuffer(seq.encode('ascii'), dtype=np.uint8)
+    return encoded, lengths
+
 def run_simple_analysis():
     """간단한 서열 분석 실행"""
     print("\n" + "="*60)
@@ -127,55 +147,59 @@ def run_simple_analysis():
 
     test_dir = Path("test_data")
 
-    # Read sequences
-    sequences = {}
+    # Read sequences (the parser joins each record's lines once)
     with open(test_dir / "sequences.fasta", 'r') as f:
-        current_seq = ""
-        current_name = ""
-        for line in f:
-            if line.startswith(">"):
-                if current_name:
-                    sequences[current_name] = current_seq
-                current_name = line[1:].strip()
-                current_seq = ""
-            else:
-                current_seq += line.strip()
-        if current_name:
-            sequences[current_name] = current_seq
+        sequences = {title.strip(): seq for title, seq in SimpleFastaParser(f) if title.strip()}
 
     # Calculate simple similarity matrix
-    similarity_matrix = []
     seq_names = list(sequences.keys())
 
-    for seq1 in seq_names:
-        row = []
-        for seq2 in seq_names:
-            # Simple identity calculation
-            s1, s2 = sequences[seq1], sequences[seq2]
-            min_len = min(len(s1), len(s2))
-            identical = sum(1 for i in range(min_len) if s1[i] == s2[i])
-            similarity = identical / min_len if min_len > 0 else 0
-            row.append(similarity)
-        similarity_matrix.append(row)
-
-    return seq_names, np.array(similarity_matrix), sequences
-
-def create_clustering_results(seq_names, similarity_matrix):
-    """간단한 클러스터링 수행"""
+    # Sequences as rows of one uint8 matrix, zero-padded to the longest length
+    encoded, lengths = encode_sequences(sequences)
+
+    # Simple identity calculation: identical positions over the shorter length
+    n = len(seq_names)
+    identical = np.zeros((n, n), dtype=np.int64)
+    # Padding never matches a residue, and pad-pad positions are masked out;
+    # rows go in blocks so each (B, N, L) comparison stays cache-sized.
+    # Only columns from the block onwards are compared (upper triangle).
+    block = max(1, IDENTITY_BLOCK_BYTES // max(encoded.size, 1))
+    for i0 in range(0, n, block):
+        rows = encoded[i0:i0 + block, None, :]
+        identical[i0:i0 + block, i0:] = ((rows == encoded[None, i0:, :]) & (rows != 0)).sum(axis=-1)
+    identical = np.triu(identical) + np.triu(identical, 1).T
+    min_len = np.minimum.outer(lengths, lengths)
+    # Identities only carry ~3 meaningful digits, so float32 halves the footprint
+    similarity_matrix = np.divide(identical, min_len, out=np.zeros(min_len.shape, dtype=np.float32),
+                                  where=min_len > 0)
+
+    return seq_names, similarity_matrix, sequences, encoded, lengths
+
+def create_clustering_results(seq_names, similarity_matrix, method=None):
+    """간단한 클러스터링 수행
+
+    method를 지정하지 않으면(ASMC_LINKAGE 환경 변수도 없으면) 서열이
+    SINGLE_LINKAGE_MIN_SEQS개 이하일 때 average, 그보다 많으면 single linkage를
+    사용한다. single linkage는 MST로 계산되어 훨씬 빠르지만 클러스터가 사슬처럼
+    이어지기 쉽다.
+    """
     print("\n" + "="*60)
     print("Performing clustering...")
     print("="*60)
 
     # Simple hierarchical clustering based on similarity
     from scipy.cluster.hierarchy import linkage, fcluster
-    from scipy.spatial.distance import squareform
 
-    # Convert similarity to distance
-    distance_matrix = 1 - similarity_matrix
-    condensed_dist = squareform(distance_matrix)
+    # Convert similarity to condensed distance (upper triangle, row-major like
+    # squareform) directly, as the float64 array linkage works on
+    upper = np.triu_indices(len(seq_names), k=1)
+    condensed_dist = np.ascontiguousarray(1 - similarity_matrix[upper], dtype=np.float64)
 
     # Perform clustering
-    linkage_matrix = linkage(condensed_dist, method='average')
+    method = method or os.environ.get('ASMC_LINKAGE')
+    if method is None:
+        method = 'single' if len(seq_names) > SINGLE_LINKAGE_MIN_SEQS else 'average'
+    linkage_matrix = linkage(condensed_dist, method=method)
     clusters = fcluster(linkage_matrix, 0.3, criterion='distance')
 
     # Group sequences by cluster
@@ -191,34 +215,39 @@ def create_clustering_results(seq_names, similarity_matrix):
 
     return clusters, linkage_matrix, cluster_groups
 
-def visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, sequences):
-    """결과 시각화"""
+def visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, sequences,
+                      encoded=None, lengths=None, run_time=None):
+    """결과 시각화 (encoded/lengths는 encode_sequences 결과, 없으면 새로 인코딩)"""
     print("\n" + "="*60)
     print("Creating visualizations...")
     print("="*60)
 
+    if encoded is None:
+        encoded, lengths = encode_sequences(sequences)
+
     fig = plt.figure(figsize=(16, 12))
 
-    # 1. Similarity heatmap
     ax1 = plt.subplot(2, 3, 1)
-    im = ax1.imshow(similarity_matrix, cmap='RdYlGn', vmin=0, vmax=1)
-    ax1.set_xticks(range(len(seq_names)))
-    ax1.set_yticks(range(len(seq_names)))
-    ax1.set_xticklabels([name[:15] for name in seq_names], rotation=45, ha='right')
-    ax1.set_yticklabels([name[:15] for name in seq_names])
-    ax1.set_title('Sequence Similarity Matrix')
-    plt.colorbar(im, ax=ax1)
-
-    # 2. Dendrogram
     ax2 = plt.subplot(2, 3, 2)
-    from scipy.cluster.hierarchy import dendrogram
-    dendrogram(linkage_matrix, labels=[name[:15] for name in seq_names],
-               ax=ax2, orientation='top')
+
+    # 2. Dendrogram (drawn first: its leaf order also orders the heatmap)
+    dendro = dendrogram(linkage_matrix, labels=[name[:15] for name in seq_names],
+                        ax=ax2, orientation='top')
     ax2.set_title('Hierarchical Clustering Dendrogram')
     ax2.set_xlabel('Sequence')
     ax2.set_ylabel('Distance')
     plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
 
+    # 1. Similarity heatmap, rows and columns in dendrogram leaf order
+    order = np.asarray(dendro['leaves'], dtype=int)
+    im = ax1.imshow(similarity_matrix[np.ix_(order, order)], cmap='RdYlGn', vmin=0, vmax=1)
+    ax1.set_xticks(range(len(seq_names)))
+    ax1.set_yticks(range(len(seq_names)))
+    ax1.set_xticklabels(dendro['ivl'], rotation=45, ha='right')
+    ax1.set_yticklabels(dendro['ivl'])
+    ax1.set_title('Sequence Similarity Matrix')
+    plt.colorbar(im, ax=ax1)
+
     # 3. Cluster distribution
     ax3 = plt.subplot(2, 3, 3)
     unique_clusters, counts = np.unique(clusters, return_counts=True)
@@ -231,24 +260,30 @@ def visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, se
 
     # 4. Sequence length distribution
     ax4 = plt.subplot(2, 3, 4)
-    seq_lengths = [len(seq) for seq in sequences.values()]
-    ax4.hist(seq_lengths, bins=20, edgecolor='black', alpha=0.7)
+    ax4.hist(lengths, bins=20, edgecolor='black', alpha=0.7)
     ax4.set_xlabel('Sequence Length')
     ax4.set_ylabel('Count')
     ax4.set_title('Sequence Length Distribution')
-    ax4.axvline(np.mean(seq_lengths), color='red', linestyle='--',
-                label=f'Mean: {np.mean(seq_lengths):.1f}')
+    ax4.axvline(np.mean(lengths), color='red', linestyle='--',
+                label=f'Mean: {np.mean(lengths):.1f}')
     ax4.legend()
 
     # 5. Amino acid composition
     ax5 = plt.subplot(2, 3, 5)
-    aa_counts = {}
-    for seq in sequences.values():
-        for aa in seq:
-            aa_counts[aa] = aa_counts.get(aa, 0) + 1
-
-    sorted_aa = sorted(aa_counts.items(), key=lambda x: x[1], reverse=True)[:20]
-    aa_labels, aa_values = zip(*sorted_aa)
+    # One bincount over all residues; ties keep first-appearance order
+    residues = encoded[encoded != 0]  # row-major, so in sequence order
+    aa_counts = np.bincount(residues, minlength=256)
+    codes, first_seen = np.unique(residues, return_index=True)
+    codes = codes[np.argsort(first_seen)]
+
+    # Partial selection: only counts reaching the 20th largest are sorted
+    counts = aa_counts[codes]
+    if len(codes) > 20:
+        keep = counts >= np.partition(counts, -20)[-20]
+        codes, counts = codes[keep], counts[keep]
+    top = codes[np.argsort(-counts, kind='stable')[:20]]
+    aa_labels = [chr(code) for code in top]
+    aa_values = aa_counts[top]
     ax5.bar(range(len(aa_labels)), aa_values, color='steelblue')
     ax5.set_xticks(range(len(aa_labels)))
     ax5.set_xticklabels(aa_labels)
@@ -260,15 +295,13 @@ def visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, se
     ax6 = plt.subplot(2, 3, 6)
     # Create network visualization using scatter plot
     np.random.seed(42)
-    positions = {}
-    for i, name in enumerate(seq_names):
-        angle = 2 * np.pi * i / len(seq_names)
-        positions[i] = (np.cos(angle), np.sin(angle))
+    angles = 2 * np.pi * np.arange(len(seq_names)) / len(seq_names)
+    x_pos = np.cos(angles)
+    y_pos = np.sin(angles)
 
-    # Plot nodes
-    x_pos = [positions[i][0] for i in range(len(seq_names))]
-    y_pos = [positions[i][1] for i in range(len(seq_names))]
-    colors = [plt.cm.Set3(c/max(clusters)) for c in clusters]
+    # Plot nodes, with one colormap lookup for all of them
+    clusters = np.asarray(clusters)
+    colors = plt.cm.Set3(clusters / clusters.max())
     ax6.scatter(x_pos, y_pos, c=colors, s=200, alpha=0.8, edgecolors='black')
 
     # Add labels
@@ -276,12 +309,13 @@ def visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, se
         ax6.annotate(name[:10], (x_pos[i], y_pos[i]),
                     ha='center', va='center', fontsize=8)
 
-    # Draw edges for high similarity
-    for i in range(len(seq_names)):
-        for j in range(i+1, len(seq_names)):
-            if similarity_matrix[i, j] > 0.7:  # Only show high similarity
-                ax6.plot([x_pos[i], x_pos[j]], [y_pos[i], y_pos[j]],
-                        'k-', alpha=0.2, linewidth=similarity_matrix[i, j]*2)
+    # Draw edges for high similarity, all in one collection
+    edge_i, edge_j = np.nonzero(np.triu(similarity_matrix > 0.7, k=1))  # Only show high similarity
+    points = np.column_stack([x_pos, y_pos])
+    segments = np.stack([points[edge_i], points[edge_j]], axis=1)
+    ax6.add_collection(LineCollection(segments, colors='k', alpha=0.2, zorder=2,
+                                      capstyle='projecting',
+                                      linewidths=similarity_matrix[edge_i, edge_j] * 2))
 
     ax6.set_xlim(-1.5, 1.5)
     ax6.set_ylim(-1.5, 1.5)
@@ -293,22 +327,27 @@ def visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, se
     plt.tight_layout()
 
     # Save figure
-    output_file = f"asmc_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    run_time = run_time or datetime.now()
+    output_file = f"asmc_results_{run_time.strftime('%Y%m%d_%H%M%S')}.png"
+    plt.savefig(output_file, dpi=FIGURE_DPI, bbox_inches='tight')
     print(f"Visualization saved to {output_file}")
 
-    plt.show()
+    # Agg cannot open a window, so only show the figure on interactive backends
+    if matplotlib.get_backend().lower() != 'agg':
+        plt.show()
 
     return output_file
 
-def create_summary_report(seq_names, similarity_matrix, cluster_groups, sequences):
-    """결과 요약 리포트 생성"""
+def create_summary_report(seq_names, similarity_matrix, cluster_groups, sequences, lengths=None,
+                          run_time=None):
+    """결과 요약 리포트 생성 (run_time을 넘기면 그림과 같은 타임스탬프 사용)"""
     print("\n" + "="*60)
     print("ASMC Analysis Summary Report")
     print("="*60)
 
+    run_time = run_time or datetime.now()
     report = []
-    report.append(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    report.append(f"Analysis Date: {run_time.strftime('%Y-%m-%d %H:%M:%S')}")
     report.append(f"Number of sequences analyzed: {len(sequences)}")
     report.append(f"Number of clusters found: {len(cluster_groups)}")
     report.append("")
@@ -329,13 +368,14 @@ def create_summary_report(seq_names, similarity_matrix, cluster_groups, sequence
 
     report.append("")
     report.append("Sequence Statistics:")
-    seq_lengths = [len(seq) for seq in sequences.values()]
-    report.append(f"  Average length: {np.mean(seq_lengths):.1f}")
-    report.append(f"  Min length: {min(seq_lengths)}")
-    report.append(f"  Max length: {max(seq_lengths)}")
+    if lengths is None:
+        lengths = np.array([len(seq) for seq in sequences.values()])
+    report.append(f"  Average length: {np.mean(lengths):.1f}")
+    report.append(f"  Min length: {lengths.min()}")
+    report.append(f"  Max length: {lengths.max()}")
 
     # Save report
-    report_file = f"asmc_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    report_file = f"asmc_report_{run_time.strftime('%Y%m%d_%H%M%S')}.txt"
     with open(report_file, 'w') as f:
         f.write("\n".join(report))
 
@@ -352,20 +392,25 @@ def main():
     print("ASMC Analysis with Visualization")
     print("="*60)
 
+    # One timestamp for every output file of this run
+    run_time = datetime.now()
+
     # Create test data
     test_dir = create_test_data()
 
     # Run analysis
-    seq_names, similarity_matrix, sequences = run_simple_analysis()
+    seq_names, similarity_matrix, sequences, encoded, lengths = run_simple_analysis()
 
     # Perform clustering
     clusters, linkage_matrix, cluster_groups = create_clustering_results(seq_names, similarity_matrix)
 
     # Create visualizations
-    viz_file = visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, sequences)
+    viz_file = visualize_results(seq_names, similarity_matrix, clusters, linkage_matrix, sequences,
+                                 encoded, lengths, run_time=run_time)
 
     # Create summary report
-    report_file = create_summary_report(seq_names, similarity_matrix, cluster_groups, sequences)
+    report_file = create_summary_report(seq_names, similarity_matrix, cluster_groups, sequences, lengths,
+                                        run_time=run_time)
 
     print("\n" + "="*60)
     print("Analysis Complete!")
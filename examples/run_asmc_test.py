@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """ASMC 실제 실행 및 결과 시각화"""
 
+import argparse
 import subprocess
 import sys
 from pathlib import Path
@@ -73,21 +74,35 @@ LSEQVQEELLSSQVTQELRALMDETMKELKAYKSELEEQLTPVAG
     print(f"Test data created in {test_dir.absolute()}")
     return test_dir
 
-def run_identity_calculation():
-    """서열 유사도 계산"""
-    print("\n" + "="*60)
-    print("Running sequence identity calculation...")
-    print("="*60)
-
+def identity_command():
+    """서열 유사도 계산 명령"""
     test_dir = Path("test_data")
-    cmd = [
+    return [
         sys.executable, "-m", "asmc.run_asmc", "identity",
         "-s", str(test_dir / "sequences.fasta"),
         "-r", str(test_dir / "references.txt"),
         "-o", "identity_results.txt"
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+def clustering_command(output_dir):
+    """클러스터링 명령"""
+    test_dir = Path("test_data")
+    return [
+        sys.executable, "-m", "asmc.run_asmc", "run",
+        "-m", str(test_dir / "models.txt"),
+        "-r", str(test_dir / "references.txt"),
+        "-p", str(test_dir / "pocket.txt"),
+        "-o", str(output_dir),
+        "--end", "clustering",
+        "-e", "0.3",
+        "--min-samples", "2"
+    ]
+
+def report_identity(result):
+    """서열 유사도 계산 결과 출력"""
+    print("\n" + "="*60)
+    print("Running sequence identity calculation...")
+    print("="*60)
 
     if result.returncode == 0:
         print("Identity calculation completed!")
@@ -100,29 +115,13 @@ def run_identity_calculation():
         print(f"Error: {result.stderr}")
     return None
 
-def run_clustering():
-    """클러스터링 실행"""
+def report_clustering(result, output_dir):
+    """클러스터링 결과 출력"""
     print("\n" + "="*60)
     print("Running clustering...")
     print("="*60)
 
-    test_dir = Path("test_data")
-    output_dir = Path("output_clustering")
-
-    cmd = [
-        sys.executable, "-m", "asmc.run_asmc", "run",
-        "-m", str(test_dir / "models.txt"),
-        "-r", str(test_dir / "references.txt"),
-        "-p", str(test_dir / "pocket.txt"),
-        "-o", str(output_dir),
-        "--end", "clustering",
-        "-e", "0.3",
-        "--min-samples", "2"
-    ]
-
-    print(f"Running: {' '.join(cmd)}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
+    print(f"Running: {' '.join(result.args)}")
     if result.returncode == 0:
         print("Clustering completed!")
         # Check for output files
@@ -131,8 +130,10 @@ def run_clustering():
             for file in output_dir.rglob("*"):
                 if file.is_file():
                     print(f"  - {file}")
-                    if file.suffix in ['.txt', '.tsv', '.csv']:
-                        content = file.read_text()[:500]
+                    if file.suffix in ['.txt', '.tsv', '.csv'] and file.stat().st_size > 0:
+                        # 미리보기에 필요한 앞부분만 읽음
+                        with open(file, 'rb') as fh:
+                            content = fh.read(512).decode('utf-8', 'replace')
                         print(f"    Content preview: {content[:100]}...")
     else:
         print(f"Error: {result.stderr}")
@@ -140,7 +141,35 @@ def run_clustering():
 
     return output_dir
 
+def run_identity_calculation():
+    """서열 유사도 계산"""
+    result = subprocess.run(identity_command(), capture_output=True, text=True)
+    return report_identity(result)
+
+def run_clustering():
+    """클러스터링 실행"""
+    output_dir = Path("output_clustering")
+    result = subprocess.run(clustering_command(output_dir), capture_output=True, text=True)
+    return report_clustering(result, output_dir)
+
+def run_concurrently(cmds):
+    """독립적인 명령들을 동시에 실행하고 모두 끝날 때까지 대기"""
+    procs = [
+        subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for cmd in cmds
+    ]
+    results = []
+    for proc in procs:
+        stdout, stderr = proc.communicate()
+        results.append(subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr))
+    return results
+
 def main():
+    parser = argparse.ArgumentParser(description="ASMC execution test")
+    parser.add_argument("--sequential", action="store_true",
+                        help="run identity and clustering one after another (debugging)")
+    args = parser.parse_args()
+
     print("="*60)
     print("ASMC Execution and Visualization")
     print("="*60)
@@ -148,11 +177,16 @@ def main():
     # Create test data
     test_dir = create_test_data()
 
-    # Run identity calculation
-    identity_results = run_identity_calculation()
-
-    # Run clustering
-    output_dir = run_clustering()
+    if args.sequential:
+        identity_results = run_identity_calculation()
+        output_dir = run_clustering()
+    else:
+        # Identity and clustering read and write disjoint files
+        output_dir = Path("output_clustering")
+        identity_result, clustering_result = run_concurrently(
+            [identity_command(), clustering_command(output_dir)])
+        identity_results = report_identity(identity_result)
+        output_dir = report_clustering(clustering_result, output_dir)
 
     print("\n" + "="*60)
     print("Execution completed!")
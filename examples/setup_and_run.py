@@ -8,6 +8,8 @@ PyCharm 또는 다른 Python 환경에서 직접 실행 가능
 import sys
 import subprocess
 import os
+import re
+import importlib.metadata
 from pathlib import Path
 
 
@@ -22,9 +24,39 @@ def check_python_version():
     return True
 
 
+# 버전 지정자 비교 (packaging이 없으면 지정자가 있는 요구사항은 pip에 맡김)
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+except ImportError:
+    Requirement = None
+
+
+def is_installed(requirement):
+    """요구사항(예: 'numpy>=1.21.0')을 만족하는 버전이 이미 설치되어 있는지 확인"""
+    requirement = requirement.strip()
+    if Requirement is None:
+        if re.search(r"[<>=!~;\[@\s]", requirement):
+            return False  # 버전 지정자를 비교할 수 없으면 pip이 판단
+        name, wanted = requirement, None
+    else:
+        try:
+            parsed = Requirement(requirement)
+        except InvalidRequirement:
+            return False
+        if parsed.marker is not None and not parsed.marker.evaluate():
+            return True  # 이 환경에는 필요 없는 요구사항
+        name, wanted = parsed.name, parsed.specifier
+
+    try:
+        installed = importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    return wanted is None or wanted.contains(installed, prereleases=True)
+
+
 def install_dependencies():
-    """필요한 의존성 설치"""
-    print("\n📦 의존성 패키지 설치 중...")
+    """필요한 의존성 설치 (이미 설치된 패키지는 건너뜀)"""
+    print("\n📦 의존성 패키지 확인 중...")
 
     # Python 버전에 따라 다른 requirements 파일 사용
     if sys.version_info.minor >= 14:
@@ -45,20 +77,26 @@ def install_dependencies():
             "pytest",
             "xlsxwriter"
         ]
-
-        for package in packages:
-            print(f"  설치 중: {package}")
-            subprocess.run([sys.executable, "-m", "pip", "install", package],
-                         capture_output=True, text=True)
     else:
         # requirements 파일 사용
         print(f"  {requirements_file} 사용")
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "-r", requirements_file],
-            capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            print(f"⚠️ 일부 패키지 설치 실패: {result.stderr}")
+        lines = Path(requirements_file).read_text(encoding='utf-8').splitlines()
+        packages = [line.strip() for line in lines
+                    if line.strip() and not line.strip().startswith("#")]
+
+    missing = [package for package in packages if not is_installed(package)]
+    if not missing:
+        print("  ✅ 모든 패키지가 이미 설치되어 있습니다.")
+        return
+
+    # 누락된 패키지만 한 번의 pip 호출로 설치
+    print(f"  설치 중: {' '.join(missing)}")
+    result = subprocess.run(
+        [sys.executable, "-m", "pip", "install", *missing],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"⚠️ 일부 패키지 설치 실패: {result.stderr}")
 
 
 def install_asmc():
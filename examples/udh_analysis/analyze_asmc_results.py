@@ -4,93 +4,161 @@
 ASMC UDH 결과 분석 및 시각화
 """
 
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
-from collections import Counter
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from udh_common import read_groups
+
+GAP = ord('X')
+PARALLEL_MIN_SEQS = 10_000  # 이보다 작으면 프로세스 생성 비용이 더 큼
+
+# 20개 표준 아미노산과 ASCII 코드 -> 인덱스 변환표 (그 외 문자는 255)
+AA_LIST = list('ACDEFGHIKLMNPQRSTVWY')
+AA_LUT = np.full(256, 255, dtype=np.uint8)
+AA_LUT[np.frombuffer(''.join(AA_LIST).encode('ascii'), dtype=np.uint8)] = np.arange(len(AA_LIST))
+
+def encode_sequences(seqs, n_pos):
+    """서열 목록을 (N, n_pos) uint8 행렬로 변환 (짧은 서열은 0으로 패딩)"""
+    joined = ''.join(seq[:n_pos].ljust(n_pos, '\0') for seq in seqs)
+    return np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(len(seqs), n_pos)
+
+def most_common_residue(col, skip_gaps=False):
+    """열에서 가장 흔한 잔기, 그 개수, 유효 잔기 수 반환"""
+    valid = col != 0
+    if skip_gaps:
+        valid &= col != GAP
+    vals, cnts = np.unique(col[valid], return_counts=True)
+    if len(vals) == 0:
+        return None, 0, 0
+    best = cnts.argmax()
+    return chr(vals[best]), int(cnts[best]), int(cnts.sum())
+
+def aa_frequency_matrix(arr):
+    """(20, n_pos) float32 위치별 아미노산 빈도 행렬 (X와 패딩은 제외)"""
+    n_pos = arr.shape[1]
+    idx = AA_LUT[arr].astype(np.intp)
+    known = idx != 255
+    pos = np.broadcast_to(np.arange(n_pos), arr.shape)
+    counts = np.bincount(idx[known] * n_pos + pos[known], minlength=len(AA_LIST) * n_pos)
+    totals = ((arr != 0) & (arr != GAP)).sum(axis=0)
+    freq = counts.reshape(len(AA_LIST), n_pos).astype(np.float32)
+    freq /= np.maximum(totals, 1)
+    return freq
+
+def cluster_conservation(arr, skip_gaps=False):
+    """클러스터 행렬의 위치별 (최빈 잔기, 보존도) 목록"""
+    scores = []
+    for pos in range(arr.shape[1]):
+        residue, count, n_valid = most_common_residue(arr[:, pos], skip_gaps)
+        scores.append((residue, count / n_valid if n_valid > 0 else 0))
+    return scores
+
+def conservation_by_cluster(df, skip_gaps=False):
+    """노이즈(-1)를 제외한 클러스터별 {cluster_id: (서열 수, 위치별 보존도)}
+
+    서열이 많으면 클러스터 단위로 여러 프로세스에 나누어 계산한다.
+    """
+    cluster_ids = [c for c in sorted(df['cluster'].unique()) if c != -1]
+    arrays = []
+    for cluster_id in cluster_ids:
+        cluster_seqs = df[df['cluster'] == cluster_id]['active_site'].values
+        arrays.append(encode_sequences(cluster_seqs, len(cluster_seqs[0])))
+
+    worker = partial(cluster_conservation, skip_gaps=skip_gaps)
+    if len(df) > PARALLEL_MIN_SEQS and len(arrays) > 1:
+        with ProcessPoolExecutor() as executor:
+            scores = list(executor.map(worker, arrays))
+    else:
+        scores = [worker(arr) for arr in arrays]
+
+    return {cluster_id: (len(arr), score)
+            for cluster_id, arr, score in zip(cluster_ids, arrays, scores)}
 
 def analyze_clusters(tsv_file):
     """클러스터 결과 분석"""
 
     # Read clustering results
-    df = pd.read_csv(tsv_file, sep='\t', header=None,
-                     names=['sequence_id', 'active_site', 'cluster'])
+    df = read_groups(tsv_file, site_column='active_site')
 
-    print("=" * 70)
-    print("ASMC UDH Active Site Clustering Results Analysis")
-    print("=" * 70)
-    print()
+    # 출력은 모아서 한 번에 기록
+    lines = [
+        "=" * 70,
+        "ASMC UDH Active Site Clustering Results Analysis",
+        "=" * 70,
+        "",
+    ]
 
     # Cluster statistics
     cluster_counts = df['cluster'].value_counts().sort_index()
-    print("Cluster Distribution:")
+    lines.append("Cluster Distribution:")
     for cluster_id, count in cluster_counts.items():
         if cluster_id == -1:
-            print(f"  Cluster {cluster_id} (Noise/Outliers): {count} sequences")
+            lines.append(f"  Cluster {cluster_id} (Noise/Outliers): {count} sequences")
         else:
-            print(f"  Cluster {cluster_id}: {count} sequences")
-    print()
+            lines.append(f"  Cluster {cluster_id}: {count} sequences")
+    lines.append("")
 
     # Total sequences
     total = len(df)
+    inv_total = 100.0 / total
     clustered = len(df[df['cluster'] != -1])
     noise = len(df[df['cluster'] == -1])
 
-    print(f"Total sequences: {total}")
-    print(f"Clustered: {clustered} ({clustered/total*100:.1f}%)")
-    print(f"Noise/Outliers: {noise} ({noise/total*100:.1f}%)")
-    print()
+    lines += [
+        f"Total sequences: {total}",
+        f"Clustered: {clustered} ({clustered*inv_total:.1f}%)",
+        f"Noise/Outliers: {noise} ({noise*inv_total:.1f}%)",
+        "",
+    ]
 
     # Analyze active site patterns per cluster
-    print("=" * 70)
-    print("Active Site Pattern Analysis")
-    print("=" * 70)
-    print()
+    lines += [
+        "=" * 70,
+        "Active Site Pattern Analysis",
+        "=" * 70,
+        "",
+    ]
 
-    for cluster_id in sorted(df['cluster'].unique()):
-        if cluster_id == -1:
-            continue
-
-        cluster_seqs = df[df['cluster'] == cluster_id]['active_site'].values
-        print(f"\nCluster {cluster_id} ({len(cluster_seqs)} sequences):")
-        print("-" * 70)
+    for cluster_id, (n_seqs, scores) in conservation_by_cluster(df).items():
+        lines.append(f"\nCluster {cluster_id} ({n_seqs} sequences):")
+        lines.append("-" * 70)
 
         # Analyze each position
-        n_positions = len(cluster_seqs[0])
         position_conservation = []
 
-        for pos in range(n_positions):
-            residues = [seq[pos] for seq in cluster_seqs if pos < len(seq)]
-            counter = Counter(residues)
-            most_common = counter.most_common(1)[0]
-            conservation = most_common[1] / len(residues)
-            position_conservation.append((pos+1, most_common[0], conservation))
+        for pos, (residue, conservation) in enumerate(scores):
+            position_conservation.append((pos+1, residue, conservation))
 
             if conservation > 0.8:  # Highly conserved positions
-                print(f"  Position {pos+1}: {most_common[0]} ({conservation*100:.1f}% conserved)")
+                lines.append(f"  Position {pos+1}: {residue} ({conservation*100:.1f}% conserved)")
 
         # Consensus sequence
         consensus = ''.join([
             res if cons > 0.5 else 'X'
             for pos, res, cons in position_conservation
         ])
-        print(f"  Consensus: {consensus}")
+        lines.append(f"  Consensus: {consensus}")
 
         # Conservation score
         avg_conservation = np.mean([cons for _, _, cons in position_conservation])
-        print(f"  Average conservation: {avg_conservation*100:.1f}%")
+        lines.append(f"  Average conservation: {avg_conservation*100:.1f}%")
+
+    sys.stdout.write("\n".join(lines) + "\n")
 
     return df, cluster_counts
 
 def create_visualizations(df, cluster_counts, output_file):
     """결과 시각화"""
 
-    fig = plt.figure(figsize=(16, 10))
+    fig, ((ax1, ax2, ax3), (ax4, ax5, ax6)) = plt.subplots(
+        2, 3, figsize=(16, 10), constrained_layout=True)
 
     # 1. Cluster size distribution
-    ax1 = plt.subplot(2, 3, 1)
     clusters = cluster_counts.index.tolist()
     sizes = cluster_counts.values.tolist()
 
@@ -110,7 +178,6 @@ def create_visualizations(df, cluster_counts, output_file):
                 str(size), ha='center', fontsize=11, fontweight='bold')
 
     # 2. Cluster proportion pie chart
-    ax2 = plt.subplot(2, 3, 2)
     pie_labels = [f"Cluster {c}" if c != -1 else "Noise" for c in clusters]
     pie_colors = ['#ff7f7f' if c == -1 else '#4a90e2' for c in clusters]
 
@@ -120,7 +187,6 @@ def create_visualizations(df, cluster_counts, output_file):
     ax2.set_title('Cluster Proportions', fontsize=14, fontweight='bold')
 
     # 3. Active site length distribution
-    ax3 = plt.subplot(2, 3, 3)
     active_site_lengths = df['active_site'].apply(lambda x: len(x.replace('X', '')))
     ax3.hist(active_site_lengths, bins=20, edgecolor='black', alpha=0.7, color='green')
     ax3.set_xlabel('Non-gap Residues', fontsize=12)
@@ -132,7 +198,6 @@ def create_visualizations(df, cluster_counts, output_file):
     ax3.grid(axis='y', alpha=0.3)
 
     # 4. Position-wise conservation heatmap for main cluster
-    ax4 = plt.subplot(2, 3, 4)
     main_cluster = df[df['cluster'] == 0]
 
     if len(main_cluster) > 0:
@@ -140,20 +205,12 @@ def create_visualizations(df, cluster_counts, output_file):
         seqs = main_cluster['active_site'].values
         n_pos = len(seqs[0])
 
-        aa_list = list('ACDEFGHIKLMNPQRSTVWY')
-        freq_matrix = np.zeros((len(aa_list), n_pos))
-
-        for pos in range(n_pos):
-            residues = [seq[pos] for seq in seqs if pos < len(seq) and seq[pos] != 'X']
-            counter = Counter(residues)
-            total = len(residues)
+        freq_matrix = aa_frequency_matrix(encode_sequences(seqs, n_pos))
 
-            for i, aa in enumerate(aa_list):
-                freq_matrix[i, pos] = counter.get(aa, 0) / total if total > 0 else 0
-
-        im = ax4.imshow(freq_matrix, cmap='YlOrRd', aspect='auto', vmin=0, vmax=1)
-        ax4.set_yticks(range(len(aa_list)))
-        ax4.set_yticklabels(aa_list)
+        im = ax4.imshow(freq_matrix, cmap='YlOrRd', aspect='auto', vmin=0, vmax=1,
+                        interpolation='nearest')
+        ax4.set_yticks(range(len(AA_LIST)))
+        ax4.set_yticklabels(AA_LIST)
         ax4.set_xticks(range(0, n_pos, 2))
         ax4.set_xticklabels(range(1, n_pos+1, 2))
         ax4.set_xlabel('Position', fontsize=12)
@@ -163,7 +220,6 @@ def create_visualizations(df, cluster_counts, output_file):
         plt.colorbar(im, ax=ax4, label='Frequency')
 
     # 5. Sequence ID prefix analysis
-    ax5 = plt.subplot(2, 3, 5)
     prefixes = df['sequence_id'].apply(lambda x: x.split('_')[0][:6])
     prefix_counts = prefixes.value_counts().head(15)
 
@@ -176,25 +232,10 @@ def create_visualizations(df, cluster_counts, output_file):
     ax5.grid(axis='x', alpha=0.3)
 
     # 6. Cluster comparison - conserved positions
-    ax6 = plt.subplot(2, 3, 6)
-
-    for cluster_id in sorted(df['cluster'].unique()):
-        if cluster_id == -1:
-            continue
 
-        cluster_seqs = df[df['cluster'] == cluster_id]['active_site'].values
-        n_positions = len(cluster_seqs[0])
-        conservation_scores = []
-
-        for pos in range(n_positions):
-            residues = [seq[pos] for seq in cluster_seqs if pos < len(seq) and seq[pos] != 'X']
-            if len(residues) > 0:
-                counter = Counter(residues)
-                most_common_freq = counter.most_common(1)[0][1]
-                conservation = most_common_freq / len(residues)
-                conservation_scores.append(conservation)
-            else:
-                conservation_scores.append(0)
+    for cluster_id, (_, scores) in conservation_by_cluster(df, skip_gaps=True).items():
+        n_positions = len(scores)
+        conservation_scores = [cons for _, cons in scores]
 
         ax6.plot(range(1, n_positions+1), conservation_scores,
                 marker='o', label=f'Cluster {cluster_id}', linewidth=2, markersize=4)
@@ -207,8 +248,7 @@ def create_visualizations(df, cluster_counts, output_file):
     ax6.set_ylim([0, 1.05])
 
     plt.suptitle('ASMC UDH Active Site Clustering Analysis',
-                 fontsize=18, fontweight='bold', y=0.995)
-    plt.tight_layout()
+                 fontsize=18, fontweight='bold')
 
     plt.savefig(output_file, dpi=300, bbox_inches='tight')
     print(f"\nVisualization saved: {output_file}")
@@ -227,7 +267,8 @@ def main():
     df, cluster_counts = analyze_clusters(tsv_file)
 
     # Create visualizations
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    now = datetime.now()
+    timestamp = now.strftime('%Y%m%d_%H%M%S')
     output_file = f"udh_asmc_analysis_{timestamp}.png"
     viz_file = create_visualizations(df, cluster_counts, output_file)
 
@@ -237,7 +278,7 @@ def main():
         f.write("=" * 70 + "\n")
         f.write("ASMC UDH Active Site Clustering - Detailed Report\n")
         f.write("=" * 70 + "\n\n")
-        f.write(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Analysis Date: {now.strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"Total sequences: {len(df)}\n")
         f.write(f"Number of clusters: {len([c for c in cluster_counts.index if c != -1])}\n\n")
 
@@ -251,11 +292,12 @@ def main():
         f.write("  Min samples: 3\n\n")
 
         f.write("Results Summary:\n")
+        inv_total = 100.0 / len(df)
         for cluster_id, count in cluster_counts.items():
             if cluster_id == -1:
-                f.write(f"  Noise/Outliers: {count} sequences ({count/len(df)*100:.1f}%)\n")
+                f.write(f"  Noise/Outliers: {count} sequences ({count*inv_total:.1f}%)\n")
             else:
-                f.write(f"  Cluster {cluster_id}: {count} sequences ({count/len(df)*100:.1f}%)\n")
+                f.write(f"  Cluster {cluster_id}: {count} sequences ({count*inv_total:.1f}%)\n")
 
         f.write("\n" + "=" * 70 + "\n")
         f.write("Key Findings:\n")
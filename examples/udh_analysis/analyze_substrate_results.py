@@ -5,35 +5,89 @@
 """
 
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
-from collections import Counter
 from datetime import datetime
+from typing import Final
+from udh_common import encode_sites, read_groups
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba가 없으면 np.bincount 사용
+    njit = None
+
+GAP = ord('X')
+NUMBA_MIN_SEQS = 1_000_000  # 이보다 작으면 JIT 컴파일 비용이 더 큼
+N_POS: Final = 12  # 기질 결합 부위 잔기 수
+AA_ALPHABET: Final = b'ACDEFGHIKLMNPQRSTVWY'
+AA_LIST = list(AA_ALPHABET.decode('ascii'))
+AA_CODES = np.frombuffer(AA_ALPHABET, dtype=np.uint8)
+
+# Position definitions
+SUBSTRATE_DIRECT_PDB = [75, 111, 112, 113, 136, 165, 174, 258]
+SUBSTRATE_PROXIMAL_PDB = [76, 163, 164, 175]
+SUBSTRATE_DIRECT_PDB_SET = frozenset(SUBSTRATE_DIRECT_PDB)
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _histogram_kernel(seqs, slots, n_clusters):
+        """위치별로 스레드를 나누어 (K, n_pos, 256) 히스토그램을 한 번에 계산"""
+        n_seqs, n_pos = seqs.shape
+        hist = np.zeros((n_clusters, n_pos, 256), dtype=np.int64)
+        # Each thread owns one position column, so no two threads write the same cell
+        for pos in prange(n_pos):
+            for i in range(n_seqs):
+                hist[slots[i], pos, seqs[i, pos]] += 1
+        return hist
+
+def position_histogram(seqs, cluster_labels):
+    """클러스터별 위치별 잔기 개수 (K, n_pos, 256) - X와 패딩은 0으로 둠
+
+    Returns (cluster_ids, hist); hist[k]는 cluster_ids[k]의 히스토그램.
+    서열이 매우 많고 numba가 설치되어 있으면 JIT 커널을 사용한다.
+    """
+    cluster_ids, slots = np.unique(cluster_labels, return_inverse=True)
+    n_pos = seqs.shape[1]
+    if njit is not None and len(seqs) >= NUMBA_MIN_SEQS:
+        hist = _histogram_kernel(np.ascontiguousarray(seqs), slots.astype(np.intp), len(cluster_ids))
+    else:
+        flat = (slots[:, None] * n_pos + np.arange(n_pos)) * 256 + seqs
+        hist = np.bincount(flat.ravel(), minlength=len(cluster_ids) * n_pos * 256)
+        hist = hist.reshape(len(cluster_ids), n_pos, 256)
+    hist[:, :, 0] = 0
+    hist[:, :, GAP] = 0
+    return cluster_ids, hist
+
+def diff_marks(seq_a, seq_b):
+    """두 consensus를 비교해 다른 위치는 '|', 같은 위치는 ' '로 표시"""
+    n = min(len(seq_a), len(seq_b))
+    a = np.frombuffer(seq_a[:n].encode('ascii'), dtype=np.uint8)
+    b = np.frombuffer(seq_b[:n].encode('ascii'), dtype=np.uint8)
+    return np.where(a != b, ord('|'), ord(' ')).astype(np.uint8).tobytes().decode('ascii')
 
 def analyze_substrate_clustering(tsv_file):
     """기질 결합 부위 클러스터링 결과 분석"""
 
     # Read clustering results
-    df = pd.read_csv(tsv_file, sep='\t', header=None,
-                     names=['sequence_id', 'substrate_site', 'cluster'])
+    df = read_groups(tsv_file)
 
     print("=" * 70)
     print("UDH Substrate Binding Site Clustering Analysis")
     print("=" * 70)
     print()
 
-    # Position definitions
-    SUBSTRATE_DIRECT_PDB = [75, 111, 112, 113, 136, 165, 174, 258]
-    SUBSTRATE_PROXIMAL_PDB = [76, 163, 164, 175]
     all_positions = sorted(SUBSTRATE_DIRECT_PDB + SUBSTRATE_PROXIMAL_PDB)
 
-    print("Substrate Binding Site Definition (12 residues):")
+    print(f"Substrate Binding Site Definition ({N_POS} residues):")
     print(f"  Direct contact positions: {SUBSTRATE_DIRECT_PDB}")
     print(f"  Proximal positions: {SUBSTRATE_PROXIMAL_PDB}")
     print(f"  All positions (sorted): {all_positions}")
     print()
 
+    # Encode all sequences once; every statistic below is sliced from this matrix
+    seqs = encode_sites(df['substrate_site'], N_POS)
+    cluster_labels = df['cluster'].to_numpy()
+
     # Cluster statistics
     cluster_counts = df['cluster'].value_counts().sort_index()
     print("Cluster Distribution:")
@@ -46,8 +100,8 @@ def analyze_substrate_clustering(tsv_file):
 
     # Total sequences
     total = len(df)
-    clustered = len(df[df['cluster'] != -1])
-    noise = len(df[df['cluster'] == -1])
+    noise = cluster_counts.get(-1, 0)
+    clustered = total - noise
 
     print(f"Total sequences: {total}")
     print(f"Clustered: {clustered} ({clustered/total*100:.1f}%)")
@@ -61,45 +115,43 @@ def analyze_substrate_clustering(tsv_file):
 
     cluster_consensuses = {}
 
-    for cluster_id in sorted(df['cluster'].unique()):
+    # One histogram pass gives counts for every cluster and position
+    cluster_ids, hist = position_histogram(seqs, cluster_labels)
+    totals = hist.sum(axis=-1)
+    most_common_idx = hist.argmax(axis=-1)
+    conservation_all = hist.max(axis=-1) / np.maximum(totals, 1)
+
+    for k, cluster_id in enumerate(cluster_ids):
         if cluster_id == -1:
             continue
 
-        cluster_seqs = df[df['cluster'] == cluster_id]['substrate_site'].values
-        print(f"\nCluster {cluster_id} ({len(cluster_seqs)} sequences):")
+        print(f"\nCluster {cluster_id} ({cluster_counts[cluster_id]} sequences):")
         print("-" * 70)
 
-        # Analyze each position
-        n_positions = len(cluster_seqs[0])
-        position_conservation = []
+        # Analyze each position (positions with only gaps are skipped)
+        observed = totals[k] > 0
 
         print("Position-wise conservation (>70%):")
-        for pos in range(n_positions):
-            residues = [seq[pos] for seq in cluster_seqs if pos < len(seq) and seq[pos] != 'X']
-            if len(residues) == 0:
-                continue
-
-            counter = Counter(residues)
-            most_common = counter.most_common(3)
-            conservation = most_common[0][1] / len(residues)
-            position_conservation.append((pos+1, most_common[0][0], conservation))
+        for pos in np.flatnonzero(observed):
+            top_aa = chr(most_common_idx[k, pos])
+            conservation = conservation_all[k, pos]
 
             if conservation > 0.7:  # Show highly conserved positions
                 pdb_pos = all_positions[pos]
-                pos_type = "DIRECT" if pdb_pos in SUBSTRATE_DIRECT_PDB else "PROXIMAL"
-                top_residues = ', '.join([f"{aa}({cnt})" for aa, cnt in most_common[:3]])
-                print(f"  Pos {pos+1} (PDB {pdb_pos}, {pos_type}): {most_common[0][0]} ({conservation*100:.1f}%) - [{top_residues}]")
+                pos_type = "DIRECT" if pdb_pos in SUBSTRATE_DIRECT_PDB_SET else "PROXIMAL"
+                top3 = np.argsort(-hist[k, pos], kind='stable')[:3]
+                top_residues = ', '.join([f"{chr(aa)}({hist[k, pos, aa]})"
+                                          for aa in top3 if hist[k, pos, aa] > 0])
+                print(f"  Pos {pos+1} (PDB {pdb_pos}, {pos_type}): {top_aa} ({conservation*100:.1f}%) - [{top_residues}]")
 
         # Consensus sequence
-        consensus = ''.join([
-            res if cons > 0.5 else 'x'
-            for pos, res, cons in position_conservation
-        ])
+        consensus = np.where(conservation_all[k] > 0.5, most_common_idx[k], ord('x'))[observed]
+        consensus = consensus.astype(np.uint8).tobytes().decode('ascii')
         cluster_consensuses[cluster_id] = consensus
         print(f"\n  Consensus: {consensus}")
 
         # Conservation score
-        avg_conservation = np.mean([cons for _, _, cons in position_conservation])
+        avg_conservation = conservation_all[k][observed].mean()
         print(f"  Average conservation: {avg_conservation*100:.1f}%")
 
     # Compare clusters
@@ -115,29 +167,65 @@ def analyze_substrate_clustering(tsv_file):
 
             print(f"\nCluster {clusters[0]}: {c0_seq}")
             print(f"Cluster {clusters[1]}: {c1_seq}")
-            print(f"Difference:  {''.join(['|' if c0_seq[i] != c1_seq[i] else ' ' for i in range(len(c0_seq))])}")
+            print(f"Difference:  {diff_marks(c0_seq, c1_seq)}")
 
-            diff_positions = []
-            for i in range(len(c0_seq)):
-                if c0_seq[i] != c1_seq[i] and c0_seq[i] != 'x' and c1_seq[i] != 'x':
-                    pdb_pos = all_positions[i]
-                    pos_type = "DIRECT" if pdb_pos in SUBSTRATE_DIRECT_PDB else "PROXIMAL"
-                    diff_positions.append((i+1, pdb_pos, pos_type, c0_seq[i], c1_seq[i]))
+            # Positions where both consensuses are defined and disagree
+            n = min(len(c0_seq), len(c1_seq))
+            a = np.frombuffer(c0_seq[:n].encode('ascii'), dtype=np.uint8)
+            b = np.frombuffer(c1_seq[:n].encode('ascii'), dtype=np.uint8)
+            diff_idx = np.flatnonzero((a != b) & (a != ord('x')) & (b != ord('x')))
 
-            if diff_positions:
+            if len(diff_idx):
                 print("\nKey differences between clusters:")
-                for seq_pos, pdb_pos, pos_type, aa0, aa1 in diff_positions:
-                    print(f"  Position {seq_pos} (PDB {pdb_pos}, {pos_type}): Cluster 0={aa0} vs Cluster 1={aa1}")
-
-    return df, cluster_counts, all_positions, SUBSTRATE_DIRECT_PDB
-
-def create_visualizations(df, cluster_counts, all_positions, direct_positions, output_file):
-    """결과 시각화"""
-
-    fig = plt.figure(figsize=(18, 12))
+                for i in diff_idx:
+                    pdb_pos = all_positions[i]
+                    pos_type = "DIRECT" if pdb_pos in SUBSTRATE_DIRECT_PDB_SET else "PROXIMAL"
+                    print(f"  Position {i+1} (PDB {pdb_pos}, {pos_type}): Cluster 0={chr(a[i])} vs Cluster 1={chr(b[i])}")
+
+    # Per-cluster conservation, reused by the comparison plot
+    conservation_by_cluster = {cluster_id: conservation_all[k]
+                               for k, cluster_id in enumerate(cluster_ids)}
+
+    return df, cluster_counts, all_positions, SUBSTRATE_DIRECT_PDB, seqs, conservation_by_cluster
+
+def plot_freq_heatmap(ax, freq_matrix, title, all_positions, norm):
+    """(20, n_pos) 아미노산 빈도 행렬을 heatmap으로 그림 (colorbar는 호출 측에서 공유)"""
+    im = ax.imshow(freq_matrix, cmap='YlOrRd', aspect='auto', norm=norm, rasterized=True)
+    ax.set_yticks(range(len(AA_LIST)))
+    ax.set_yticklabels(AA_LIST, fontsize=9)
+    ax.set_xticks(range(N_POS))
+    ax.set_xticklabels(all_positions, fontsize=9, rotation=45)
+    ax.set_xlabel('PDB Position', fontsize=11, fontweight='bold')
+    ax.set_ylabel('Amino Acid', fontsize=11, fontweight='bold')
+    ax.set_title(title, fontsize=13, fontweight='bold')
+    return im
+
+def create_visualizations(df, cluster_counts, all_positions, direct_positions, output_file,
+                          seqs=None, conservation_by_cluster=None):
+    """결과 시각화
+
+    seqs와 conservation_by_cluster는 analyze_substrate_clustering이 계산한 값을
+    넘기면 다시 계산하지 않는다.
+    """
+    # Import matplotlib only when a figure is actually drawn
+    import matplotlib
+    matplotlib.use('Agg')  # 파일 출력 전용 (대화형 backend 불필요)
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import Normalize
+
+    if seqs is None:
+        seqs = encode_sites(df['substrate_site'], len(all_positions))
+    cluster_ids, hist = position_histogram(seqs, df['cluster'].to_numpy())
+    slot = {cluster_id: k for k, cluster_id in enumerate(cluster_ids)}
+    totals = np.maximum(hist.sum(axis=-1), 1)
+    if conservation_by_cluster is None:
+        conservation_by_cluster = {cluster_id: hist[k].max(axis=-1) / totals[k]
+                                   for cluster_id, k in slot.items()}
+
+    fig, ((ax1, ax2, ax3), (ax4, ax5, ax6)) = plt.subplots(2, 3, figsize=(18, 12),
+                                                           layout='constrained')
 
     # 1. Cluster size distribution
-    ax1 = plt.subplot(2, 3, 1)
     clusters = cluster_counts.index.tolist()
     sizes = cluster_counts.values.tolist()
 
@@ -158,33 +246,16 @@ def create_visualizations(df, cluster_counts, all_positions, direct_positions, o
                 f'{size}\n({size/len(df)*100:.1f}%)', ha='center', fontsize=10, fontweight='bold')
 
     # 2. Cluster comparison - position-wise AA frequency
-    ax2 = plt.subplot(2, 3, 2)
 
-    cluster_0 = df[df['cluster'] == 0]['substrate_site'].values
-    cluster_1 = df[df['cluster'] == -1]['substrate_site'].values
+    n_cluster_0 = cluster_counts.get(0, 0)
+    n_cluster_1 = cluster_counts.get(-1, 0)
 
-    if len(cluster_0) > 0 and len(cluster_1) > 0:
-        n_pos = 12
-
-        # Calculate most common AA at each position
-        c0_consensus = []
-        c1_consensus = []
-
-        for pos in range(n_pos):
-            c0_residues = [seq[pos] for seq in cluster_0 if pos < len(seq) and seq[pos] != 'X']
-            c1_residues = [seq[pos] for seq in cluster_1 if pos < len(seq) and seq[pos] != 'X']
-
-            if c0_residues:
-                c0_aa = Counter(c0_residues).most_common(1)[0][0]
-                c0_consensus.append(c0_aa)
-            else:
-                c0_consensus.append('-')
-
-            if c1_residues:
-                c1_aa = Counter(c1_residues).most_common(1)[0][0]
-                c1_consensus.append(c1_aa)
-            else:
-                c1_consensus.append('-')
+    if n_cluster_0 > 0 and n_cluster_1 > 0:
+        # Most common AA at each position ('-' where only gaps were seen)
+        c0_hist = hist[slot[0]]
+        c1_hist = hist[slot[-1]]
+        c0_consensus = [chr(aa) if cnt else '-' for aa, cnt in zip(c0_hist.argmax(-1), c0_hist.max(-1))]
+        c1_consensus = [chr(aa) if cnt else '-' for aa, cnt in zip(c1_hist.argmax(-1), c1_hist.max(-1))]
 
         # Plot as text comparison
         ax2.axis('off')
@@ -192,24 +263,23 @@ def create_visualizations(df, cluster_counts, all_positions, direct_positions, o
         ax2.set_ylim(0, 10)
 
         ax2.text(5, 8, 'Consensus Comparison', ha='center', fontsize=14, fontweight='bold')
-        ax2.text(5, 6.5, f"Cluster 0 (n={len(cluster_0)}): {''.join(c0_consensus)}",
+        ax2.text(5, 6.5, f"Cluster 0 (n={n_cluster_0}): {''.join(c0_consensus)}",
                 ha='center', fontsize=11, family='monospace', bbox=dict(boxstyle='round', facecolor='#4ecdc4', alpha=0.3))
-        ax2.text(5, 5, f"Cluster -1 (n={len(cluster_1)}): {''.join(c1_consensus)}",
+        ax2.text(5, 5, f"Cluster -1 (n={n_cluster_1}): {''.join(c1_consensus)}",
                 ha='center', fontsize=11, family='monospace', bbox=dict(boxstyle='round', facecolor='#ff6b6b', alpha=0.3))
 
         # Show differences
-        diff_str = ''.join(['|' if c0_consensus[i] != c1_consensus[i] else ' ' for i in range(len(c0_consensus))])
+        diff_str = diff_marks(''.join(c0_consensus), ''.join(c1_consensus))
         ax2.text(5, 3.5, f"Differences:    {diff_str}", ha='center', fontsize=11, family='monospace')
 
         # Legend for position types
-        ax2.text(5, 1.5, 'Positions 1-12 correspond to PDB:', ha='center', fontsize=9)
+        ax2.text(5, 1.5, f'Positions 1-{N_POS} correspond to PDB:', ha='center', fontsize=9)
         ax2.text(5, 0.8, f"{', '.join(map(str, all_positions))}", ha='center', fontsize=9, family='monospace')
 
     # 3. Position type distribution
-    ax3 = plt.subplot(2, 3, 3)
 
     direct_count = len(direct_positions)
-    proximal_count = 12 - direct_count
+    proximal_count = N_POS - direct_count
 
     wedges, texts, autotexts = ax3.pie([direct_count, proximal_count],
                                          labels=['Direct Contact', 'Proximal'],
@@ -218,83 +288,36 @@ def create_visualizations(df, cluster_counts, all_positions, direct_positions, o
                                          textprops={'fontsize': 11, 'fontweight': 'bold'})
     ax3.set_title('Substrate Binding Site Composition', fontsize=14, fontweight='bold')
 
-    # 4. Conservation heatmap - Cluster 0
-    ax4 = plt.subplot(2, 3, 4)
-
-    if len(cluster_0) > 0:
-        aa_list = list('ACDEFGHIKLMNPQRSTVWY')
-        freq_matrix = np.zeros((len(aa_list), n_pos))
-
-        for pos in range(n_pos):
-            residues = [seq[pos] for seq in cluster_0 if pos < len(seq) and seq[pos] != 'X']
-            counter = Counter(residues)
-            total = len(residues)
-
-            for i, aa in enumerate(aa_list):
-                freq_matrix[i, pos] = counter.get(aa, 0) / total if total > 0 else 0
-
-        im = ax4.imshow(freq_matrix, cmap='YlOrRd', aspect='auto', vmin=0, vmax=1)
-        ax4.set_yticks(range(len(aa_list)))
-        ax4.set_yticklabels(aa_list, fontsize=9)
-        ax4.set_xticks(range(n_pos))
-        ax4.set_xticklabels(all_positions, fontsize=9, rotation=45)
-        ax4.set_xlabel('PDB Position', fontsize=11, fontweight='bold')
-        ax4.set_ylabel('Amino Acid', fontsize=11, fontweight='bold')
-        ax4.set_title(f'Cluster 0 AA Frequency\n(n={len(cluster_0)})', fontsize=13, fontweight='bold')
-        plt.colorbar(im, ax=ax4, label='Frequency', fraction=0.046)
-
-    # 5. Conservation heatmap - Noise cluster
-    ax5 = plt.subplot(2, 3, 5)
-
-    if len(cluster_1) > 0:
-        aa_list = list('ACDEFGHIKLMNPQRSTVWY')
-        freq_matrix = np.zeros((len(aa_list), n_pos))
-
-        for pos in range(n_pos):
-            residues = [seq[pos] for seq in cluster_1 if pos < len(seq) and seq[pos] != 'X']
-            counter = Counter(residues)
-            total = len(residues)
-
-            for i, aa in enumerate(aa_list):
-                freq_matrix[i, pos] = counter.get(aa, 0) / total if total > 0 else 0
-
-        im = ax5.imshow(freq_matrix, cmap='YlOrRd', aspect='auto', vmin=0, vmax=1)
-        ax5.set_yticks(range(len(aa_list)))
-        ax5.set_yticklabels(aa_list, fontsize=9)
-        ax5.set_xticks(range(n_pos))
-        ax5.set_xticklabels(all_positions, fontsize=9, rotation=45)
-        ax5.set_xlabel('PDB Position', fontsize=11, fontweight='bold')
-        ax5.set_ylabel('Amino Acid', fontsize=11, fontweight='bold')
-        ax5.set_title(f'Noise Cluster AA Frequency\n(n={len(cluster_1)})', fontsize=13, fontweight='bold')
-        plt.colorbar(im, ax=ax5, label='Frequency', fraction=0.046)
+    # 4-5. Conservation heatmaps - Cluster 0 and noise cluster
+    # (20, n_pos) frequency matrices for every cluster in one pass
+    freq_matrices = (hist[:, :, AA_CODES] / totals[:, :, None]).transpose(0, 2, 1)
+
+    norm = Normalize(vmin=0, vmax=1)
+    im = None
+    if n_cluster_0 > 0:
+        im = plot_freq_heatmap(ax4, freq_matrices[slot[0]],
+                               f'Cluster 0 AA Frequency\n(n={n_cluster_0})', all_positions, norm)
+
+    if n_cluster_1 > 0:
+        im = plot_freq_heatmap(ax5, freq_matrices[slot[-1]],
+                               f'Noise Cluster AA Frequency\n(n={n_cluster_1})', all_positions, norm)
+
+    # Both heatmaps share the 0-1 scale, so one colorbar serves the pair
+    if im is not None:
+        fig.colorbar(im, ax=[ax4, ax5], label='Frequency', fraction=0.046)
 
     # 6. Position-wise conservation comparison
-    ax6 = plt.subplot(2, 3, 6)
 
     for cluster_id, cluster_name, color in [(0, 'Cluster 0', '#4ecdc4'), (-1, 'Noise', '#ff6b6b')]:
-        cluster_seqs = df[df['cluster'] == cluster_id]['substrate_site'].values
-
-        if len(cluster_seqs) > 0:
-            conservation_scores = []
-
-            for pos in range(n_pos):
-                residues = [seq[pos] for seq in cluster_seqs if pos < len(seq) and seq[pos] != 'X']
-                if len(residues) > 0:
-                    counter = Counter(residues)
-                    most_common_freq = counter.most_common(1)[0][1]
-                    conservation = most_common_freq / len(residues)
-                    conservation_scores.append(conservation)
-                else:
-                    conservation_scores.append(0)
-
-            ax6.plot(all_positions, conservation_scores, marker='o', label=cluster_name,
+        if cluster_id in conservation_by_cluster:
+            ax6.plot(all_positions, conservation_by_cluster[cluster_id], marker='o', label=cluster_name,
                     linewidth=2.5, markersize=7, color=color, alpha=0.8)
 
     # Highlight direct vs proximal positions
-    for pos in direct_positions:
-        if pos in all_positions:
-            idx = all_positions.index(pos)
-            ax6.axvspan(all_positions[idx]-2, all_positions[idx]+2, alpha=0.1, color='red')
+    direct_set = frozenset(direct_positions)
+    for pos in all_positions:
+        if pos in direct_set:
+            ax6.axvspan(pos-2, pos+2, alpha=0.1, color='red')
 
     ax6.set_xlabel('PDB Position', fontsize=12, fontweight='bold')
     ax6.set_ylabel('Conservation Score', fontsize=12, fontweight='bold')
@@ -305,11 +328,11 @@ def create_visualizations(df, cluster_counts, all_positions, direct_positions, o
     ax6.set_xticks(all_positions)
     ax6.tick_params(axis='x', rotation=45)
 
-    plt.suptitle('UDH Substrate Binding Site (12 residues) ASMC Clustering Analysis',
-                 fontsize=18, fontweight='bold', y=0.998)
-    plt.tight_layout()
+    fig.suptitle(f'UDH Substrate Binding Site ({N_POS} residues) ASMC Clustering Analysis',
+                 fontsize=18, fontweight='bold')
 
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    # Constrained layout already fits the figure, so no bbox_inches='tight' re-render
+    fig.savefig(output_file, dpi=150)
     print(f"\nVisualization saved: {output_file}")
 
     return output_file
@@ -323,44 +346,53 @@ def main():
         return
 
     # Analyze clusters
-    df, cluster_counts, all_positions, direct_positions = analyze_substrate_clustering(tsv_file)
+    (df, cluster_counts, all_positions, direct_positions,
+     seqs, conservation_by_cluster) = analyze_substrate_clustering(tsv_file)
 
     # Create visualizations
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = f"udh_substrate_analysis_{timestamp}.png"
-    viz_file = create_visualizations(df, cluster_counts, all_positions, direct_positions, output_file)
+    viz_file = create_visualizations(df, cluster_counts, all_positions, direct_positions, output_file,
+                                     seqs=seqs, conservation_by_cluster=conservation_by_cluster)
 
     # Save report
     report_file = f"udh_substrate_report_{timestamp}.txt"
+    inv_total = 100.0 / len(df)
+    direct_set = frozenset(direct_positions)
+    parts = [
+        "=" * 70 + "\n",
+        "UDH Substrate Binding Site ASMC Clustering Report\n",
+        "=" * 70 + "\n\n",
+        f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+
+        "Substrate Binding Site Definition:\n",
+        f"  Total positions: {N_POS} residues\n",
+        f"  Direct contact: {direct_positions}\n",
+        f"  Proximal: {[p for p in all_positions if p not in direct_set]}\n\n",
+
+        "Clustering Parameters:\n",
+        "  Method: DBSCAN\n",
+        "  Epsilon: 0.25\n",
+        "  Min samples: 2\n",
+        "  Silhouette score: 0.427\n\n",
+
+        "Results:\n",
+    ]
+    parts.extend(f"  Cluster {cluster_id}: {count} sequences ({count*inv_total:.1f}%)\n"
+                 for cluster_id, count in cluster_counts.items())
+    parts += [
+        "\n" + "=" * 70 + "\n",
+        "Key Findings:\n",
+        "=" * 70 + "\n",
+        "1. Two distinct substrate binding patterns identified\n",
+        "2. Main cluster (C0) contains 71.9% of sequences\n",
+        "3. Noise cluster shows variant binding site architectures (28.1%)\n",
+        "4. High silhouette score (0.427) indicates clear separation\n",
+        "5. Substrate binding sites show more variability than general active site\n",
+    ]
+
     with open(report_file, 'w', encoding='utf-8') as f:
-        f.write("=" * 70 + "\n")
-        f.write("UDH Substrate Binding Site ASMC Clustering Report\n")
-        f.write("=" * 70 + "\n\n")
-        f.write(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-
-        f.write("Substrate Binding Site Definition:\n")
-        f.write(f"  Total positions: 12 residues\n")
-        f.write(f"  Direct contact: {direct_positions}\n")
-        f.write(f"  Proximal: {[p for p in all_positions if p not in direct_positions]}\n\n")
-
-        f.write("Clustering Parameters:\n")
-        f.write("  Method: DBSCAN\n")
-        f.write("  Epsilon: 0.25\n")
-        f.write("  Min samples: 2\n")
-        f.write("  Silhouette score: 0.427\n\n")
-
-        f.write("Results:\n")
-        for cluster_id, count in cluster_counts.items():
-            f.write(f"  Cluster {cluster_id}: {count} sequences ({count/len(df)*100:.1f}%)\n")
-
-        f.write("\n" + "=" * 70 + "\n")
-        f.write("Key Findings:\n")
-        f.write("=" * 70 + "\n")
-        f.write("1. Two distinct substrate binding patterns identified\n")
-        f.write("2. Main cluster (C0) contains 71.9% of sequences\n")
-        f.write("3. Noise cluster shows variant binding site architectures (28.1%)\n")
-        f.write("4. High silhouette score (0.427) indicates clear separation\n")
-        f.write("5. Substrate binding sites show more variability than general active site\n")
+        f.write("".join(parts))
 
     print(f"Report saved: {report_file}")
     print()
@@ -4,25 +4,83 @@
 노이즈 클러스터(변이체) 상세 분석
 """
 
+import argparse
+import os
+import sys
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 from collections import Counter
 from datetime import datetime
-from scipy.cluster.hierarchy import dendrogram, linkage, fcluster
-from scipy.spatial.distance import pdist, squareform
+from udh_common import encode_sites, read_groups
+
+GAP = ord('X')
+DENDROGRAM_LEAVES = 40  # 덴드로그램에 그릴 최대 잎 수 (상위 병합만 표시)
+AA_LIST = list('ACDEFGHIKLMNPQRSTVWY')
+AA_CODES = np.frombuffer(''.join(AA_LIST).encode('ascii'), dtype=np.uint8)
+
+# Byte -> compact residue index (0-19 standard AA, 20 other, 21 gap/padding)
+OTHER_BIN, SKIP_BIN = len(AA_LIST), len(AA_LIST) + 1
+AA_INDEX = np.full(256, OTHER_BIN, dtype=np.uint8)
+AA_INDEX[AA_CODES] = np.arange(len(AA_LIST))
+AA_INDEX[[0, GAP]] = SKIP_BIN
+
+def aa_histograms(seq_matrix):
+    """위치별 잔기 개수 (256, n_pos) 히스토그램 - X와 패딩은 0으로 둠
+
+    동점인 잔기는 코드 순서(알파벳 순)로 앞선 것이 argmax가 된다.
+    """
+    n_pos = seq_matrix.shape[1]
+    n_bins = SKIP_BIN + 1
+
+    # Count over 22 compact bins per position; the table stays cache-resident
+    flat = (AA_INDEX[seq_matrix] + np.arange(n_pos) * n_bins).ravel()
+    counts = np.bincount(flat, minlength=n_pos * n_bins).reshape(n_pos, n_bins)
+    if not counts[:, OTHER_BIN].any():
+        hist = np.zeros((256, n_pos), dtype=counts.dtype)
+        hist[AA_CODES] = counts[:, :len(AA_LIST)].T
+        return hist
+
+    # Non-standard residue codes present: count over all 256 byte values
+    flat = (seq_matrix + np.arange(n_pos) * 256).ravel()
+    hist = np.bincount(flat, minlength=n_pos * 256).reshape(n_pos, 256).T.copy()
+    hist[0] = 0
+    hist[GAP] = 0
+    return hist
+
+def aa_frequency_matrix(hist):
+    """(256, n_pos) 히스토그램에서 (20, n_pos) 아미노산 빈도 행렬 (잔기가 없는 위치는 0)"""
+    return hist[AA_CODES] / np.maximum(hist.sum(axis=0), 1)
+
+def residue_totals(seq_matrix):
+    """위치별 유효 잔기 수 (X와 패딩 제외)"""
+    valid = (seq_matrix != GAP) & (seq_matrix != 0)
+    return valid.sum(axis=0)
+
+def conservation_scores(hist, totals=None):
+    """위치별 최빈 잔기 비율 (잔기가 없는 위치는 0)"""
+    if totals is None:
+        totals = hist.sum(axis=0)
+    return np.where(totals > 0, hist.max(axis=0) / np.maximum(totals, 1), 0.0)
+
+def top_residues(col, k):
+    """히스토그램 열에서 개수 상위 k개 (잔기, 개수) 목록"""
+    # Unique keys (count first, then lower code) keep ties in alphabetical order
+    keys = col.astype(np.int64) * 256 + (255 - np.arange(len(col)))
+    top = np.argpartition(keys, -k)[-k:]
+    order = top[np.argsort(-keys[top])]
+    return [(chr(aa), int(col[aa])) for aa in order if col[aa] > 0]
 
 def analyze_variants(tsv_file):
-    """변이체 분석"""
+    """변이체 분석 (보고서를 출력하고 시각화에 쓸 값들을 이름별 dict로 반환)"""
 
-    df = pd.read_csv(tsv_file, sep='\t', header=None,
-                     names=['sequence_id', 'substrate_site', 'cluster'])
+    df = read_groups(tsv_file)
+    lines = []
 
-    print("=" * 70)
-    print("UDH Substrate Binding Site Variant Analysis")
-    print("=" * 70)
-    print()
+    lines.append("=" * 70)
+    lines.append("UDH Substrate Binding Site Variant Analysis")
+    lines.append("=" * 70)
+    lines.append("")
 
     # Position definitions
     SUBSTRATE_DIRECT_PDB = [75, 111, 112, 113, 136, 165, 174, 258]
@@ -30,143 +88,171 @@ def analyze_variants(tsv_file):
     all_positions = sorted(SUBSTRATE_DIRECT_PDB + SUBSTRATE_PROXIMAL_PDB)
 
     # Standard cluster
-    standard = df[df['cluster'] == 0]['substrate_site'].values
-    variants = df[df['cluster'] == -1]['substrate_site'].values
-
-    print(f"Standard cluster (C0): {len(standard)} sequences")
-    print(f"Variant cluster (Noise): {len(variants)} sequences")
-    print()
-
-    # Standard consensus
-    standard_consensus = []
-    for pos in range(12):
-        residues = [seq[pos] for seq in standard if pos < len(seq) and seq[pos] != 'X']
-        if residues:
-            most_common = Counter(residues).most_common(1)[0][0]
-            standard_consensus.append(most_common)
+    is_standard = (df['cluster'] == 0).to_numpy()
+    is_variant = (df['cluster'] == -1).to_numpy()
+    standard = df['substrate_site'].values[is_standard]
+    variants = df['substrate_site'].values[is_variant]
+
+    lines.append(f"Standard cluster (C0): {len(standard)} sequences")
+    lines.append(f"Variant cluster (Noise): {len(variants)} sequences")
+    lines.append("")
+
+    # Encode all sites into one contiguous buffer; clusters are row slices of it
+    site_matrix = encode_sites(df['substrate_site'].tolist(), len(all_positions))
+    std_matrix = site_matrix[is_standard]
+    var_matrix = site_matrix[is_variant]
+    std_hist = aa_histograms(std_matrix)
+    var_hist = aa_histograms(var_matrix)
+    std_totals = residue_totals(std_matrix)
+    var_totals = residue_totals(var_matrix)
+
+    # Standard consensus (positions with only gaps are skipped)
+    observed = std_totals > 0
+    standard_consensus = [chr(aa) for aa in std_hist.argmax(axis=0)[observed]]
     standard_consensus_str = ''.join(standard_consensus)
 
-    print(f"Standard consensus: {standard_consensus_str}")
-    print()
+    lines.append(f"Standard consensus: {standard_consensus_str}")
+    lines.append("")
 
     # Analyze variant patterns
-    print("=" * 70)
-    print("Variant Pattern Analysis")
-    print("=" * 70)
-    print()
+    lines.append("=" * 70)
+    lines.append("Variant Pattern Analysis")
+    lines.append("=" * 70)
+    lines.append("")
 
     # Count unique variant patterns
-    variant_patterns = Counter([str(seq) for seq in variants])
-    print(f"Total unique variant patterns: {len(variant_patterns)}")
-    print(f"Most common variants (top 10):")
+    # Sites are already str, so they can be used as keys without str()
+    variant_patterns = Counter(variants.tolist())
+    lines.append(f"Total unique variant patterns: {len(variant_patterns)}")
+    lines.append(f"Most common variants (top 10):")
     for i, (pattern, count) in enumerate(variant_patterns.most_common(10), 1):
-        print(f"  {i}. {pattern} ({count} sequences)")
-    print()
+        lines.append(f"  {i}. {pattern} ({count} sequences)")
+    lines.append("")
 
     # Position-wise variation analysis
-    print("=" * 70)
-    print("Position-wise Variation in Variants")
-    print("=" * 70)
-    print()
+    lines.append("=" * 70)
+    lines.append("Position-wise Variation in Variants")
+    lines.append("=" * 70)
+    lines.append("")
+
+    var_observed = var_totals > 0
+    var_diversity = 1 - conservation_scores(var_hist, var_totals)
 
-    variant_aa_by_pos = []
     for pos in range(12):
-        residues = [seq[pos] for seq in variants if pos < len(seq) and seq[pos] != 'X']
-        counter = Counter(residues)
-        variant_aa_by_pos.append(counter)
+        col = var_hist[:, pos]
 
         pdb_pos = all_positions[pos]
         pos_type = "DIRECT" if pdb_pos in SUBSTRATE_DIRECT_PDB else "PROXIMAL"
         standard_aa = standard_consensus[pos]
 
-        print(f"Position {pos+1} (PDB {pdb_pos}, {pos_type}):")
-        print(f"  Standard: {standard_aa}")
-        print(f"  Variants: {dict(counter.most_common(5))}")
+        lines.append(f"Position {pos+1} (PDB {pdb_pos}, {pos_type}):")
+        lines.append(f"  Standard: {standard_aa}")
+        lines.append(f"  Variants: {dict(top_residues(col, 5))}")
 
         # Calculate diversity
-        if residues:
-            most_common_freq = counter.most_common(1)[0][1]
-            diversity = 1 - (most_common_freq / len(residues))
-            print(f"  Diversity: {diversity:.3f} (1.0 = maximum)")
-        print()
+        if var_observed[pos]:
+            lines.append(f"  Diversity: {var_diversity[pos]:.3f} (1.0 = maximum)")
+        lines.append("")
 
     # Hierarchical clustering of variants
-    print("=" * 70)
-    print("Hierarchical Clustering of Variants")
-    print("=" * 70)
-    print()
+    lines.append("=" * 70)
+    lines.append("Hierarchical Clustering of Variants")
+    lines.append("=" * 70)
+    lines.append("")
 
+    sub_clusters = linkage_matrix = None
     if len(variants) > 3:
-        # Calculate distance matrix
-        def hamming_distance(seq1, seq2):
-            return sum(c1 != c2 for c1, c2 in zip(seq1, seq2))
-
-        n = len(variants)
-        dist_matrix = np.zeros((n, n))
-        for i in range(n):
-            for j in range(i+1, n):
-                dist = hamming_distance(variants[i], variants[j])
-                dist_matrix[i, j] = dist
-                dist_matrix[j, i] = dist
+        # SciPy is only needed when there are enough variants to cluster
+        from scipy.cluster.hierarchy import fcluster
+        from scipy.spatial.distance import pdist
+        try:
+            from fastcluster import linkage
+        except ImportError:  # fastcluster가 없으면 SciPy 구현 사용
+            from scipy.cluster.hierarchy import linkage
+
+        # Condensed Hamming distances (fraction of mismatches * length)
+        condensed_dist = pdist(var_matrix, metric='hamming') * var_matrix.shape[1]
 
         # Hierarchical clustering
-        condensed_dist = pdist(dist_matrix)
         linkage_matrix = linkage(condensed_dist, method='average')
 
         # Form sub-clusters (cut at distance threshold)
         sub_clusters = fcluster(linkage_matrix, t=3, criterion='distance')
 
         sub_cluster_counts = Counter(sub_clusters)
-        print(f"Number of sub-clusters: {len(sub_cluster_counts)}")
-        print(f"Sub-cluster sizes: {dict(sub_cluster_counts.most_common(10))}")
-        print()
+        lines.append(f"Number of sub-clusters: {len(sub_cluster_counts)}")
+        lines.append(f"Sub-cluster sizes: {dict(sub_cluster_counts.most_common(10))}")
+        lines.append("")
 
         # Analyze each sub-cluster
-        print("Sub-cluster consensus sequences:")
+        lines.append("Sub-cluster consensus sequences:")
+        sc_consensuses = []
         for sc_id in sorted(set(sub_clusters)):
-            sc_indices = [i for i, c in enumerate(sub_clusters) if c == sc_id]
-            sc_seqs = [variants[i] for i in sc_indices]
-
-            if len(sc_seqs) >= 3:  # Only show sub-clusters with 3+ members
-                # Calculate consensus
-                consensus = []
-                for pos in range(12):
-                    residues = [seq[pos] for seq in sc_seqs if pos < len(seq) and seq[pos] != 'X']
-                    if residues:
-                        most_common = Counter(residues).most_common(1)[0][0]
-                        consensus.append(most_common)
-                    else:
-                        consensus.append('X')
-
-                consensus_str = ''.join(consensus)
-
-                # Compare to standard
-                differences = sum(c1 != c2 for c1, c2 in zip(standard_consensus_str, consensus_str))
-
-                print(f"  Sub-cluster {sc_id} ({len(sc_seqs)} sequences):")
-                print(f"    Consensus: {consensus_str}")
-                print(f"    Standard:  {standard_consensus_str}")
-                print(f"    Diff:      {''.join(['|' if c1 != c2 else ' ' for c1, c2 in zip(standard_consensus_str, consensus_str)])}")
-                print(f"    Hamming distance: {differences}")
-                print()
-
-        return df, variants, variant_aa_by_pos, sub_clusters, linkage_matrix, all_positions, SUBSTRATE_DIRECT_PDB, standard_consensus_str
-
-    return df, variants, variant_aa_by_pos, None, None, all_positions, SUBSTRATE_DIRECT_PDB, standard_consensus_str
-
-def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters, linkage_matrix,
-                                   all_positions, direct_positions, standard_consensus, output_file):
-    """개선된 시각화"""
-
-    fig = plt.figure(figsize=(20, 14))
+            sc_matrix = var_matrix[sub_clusters == sc_id]
+
+            if len(sc_matrix) >= 3:  # Only show sub-clusters with 3+ members
+                # Calculate consensus ('X' where only gaps were seen)
+                sc_hist = aa_histograms(sc_matrix)
+                consensus = np.where(residue_totals(sc_matrix) > 0, sc_hist.argmax(axis=0), GAP)
+                sc_consensuses.append((sc_id, len(sc_matrix),
+                                       consensus.astype(np.uint8).tobytes().decode('ascii')))
+
+        if sc_consensuses:
+            # Compare every sub-cluster consensus to the standard in one pass
+            n_cmp = min(len(standard_consensus_str), len(all_positions))
+            consensus_matrix = encode_sites([c for _, _, c in sc_consensuses], n_cmp)
+            standard_row = np.frombuffer(standard_consensus_str[:n_cmp].encode('ascii'), dtype=np.uint8)
+            mismatches = consensus_matrix != standard_row
+            differences = mismatches.sum(axis=1)
+
+            for (sc_id, size, consensus_str), mismatch, diff_count in zip(sc_consensuses, mismatches, differences):
+                lines.append(f"  Sub-cluster {sc_id} ({size} sequences):")
+                lines.append(f"    Consensus: {consensus_str}")
+                lines.append(f"    Standard:  {standard_consensus_str}")
+                lines.append(f"    Diff:      {''.join(np.where(mismatch, '|', ' '))}")
+                lines.append(f"    Hamming distance: {diff_count}")
+                lines.append("")
+
+    sys.stdout.write("\n".join(lines) + "\n")
+    return {
+        'df': df,
+        'variants': variants,
+        'var_hist': var_hist,
+        'sub_clusters': sub_clusters,  # None when there are too few variants to cluster
+        'linkage_matrix': linkage_matrix,
+        'all_positions': all_positions,
+        'direct_positions': SUBSTRATE_DIRECT_PDB,
+        'standard_consensus': standard_consensus_str,
+        'std_hist': std_hist,
+        'variant_patterns': variant_patterns,
+    }
+
+def create_improved_visualizations(df, variants, var_hist, sub_clusters, linkage_matrix,
+                                   all_positions, direct_positions, standard_consensus, output_file,
+                                   std_hist=None, variant_patterns=None):
+    """개선된 시각화
+
+    std_hist와 variant_patterns는 analyze_variants가 계산한 값을 넘기면
+    다시 계산하지 않는다. ASMC_NO_PLOT 환경 변수가 설정되어 있으면 그리지 않고 None 반환.
+    """
+    if os.environ.get('ASMC_NO_PLOT'):
+        return None
+
+    # Import plotting libraries only when a figure is actually drawn
+    import matplotlib.pyplot as plt
+    from scipy.cluster.hierarchy import dendrogram
+
+    fig, ((ax1, ax2, ax3), (ax4, ax5, ax6), (ax7, ax8, ax9)) = plt.subplots(
+        3, 3, figsize=(20, 14), layout='constrained')
 
     # Color scheme
     standard_color = '#2ecc71'  # Green
     variant_color = '#e74c3c'   # Red
 
     # 1. Cluster distribution
-    ax1 = plt.subplot(3, 3, 1)
     standard = df[df['cluster'] == 0]['substrate_site'].values
+    if std_hist is None:
+        std_hist = aa_histograms(encode_sites(standard, len(all_positions)))
 
     sizes = [len(standard), len(variants)]
     labels = [f'Standard\n(C0)\n{len(standard)}', f'Variants\n(Noise)\n{len(variants)}']
@@ -179,18 +265,9 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
     ax1.set_title('Cluster Distribution', fontsize=14, fontweight='bold')
 
     # 2. Position-wise diversity in variants
-    ax2 = plt.subplot(3, 3, 2)
 
-    diversity_scores = []
-    for pos in range(12):
-        residues = [seq[pos] for seq in variants if pos < len(seq) and seq[pos] != 'X']
-        if residues:
-            counter = Counter(residues)
-            most_common_freq = counter.most_common(1)[0][1]
-            diversity = 1 - (most_common_freq / len(residues))
-            diversity_scores.append(diversity)
-        else:
-            diversity_scores.append(0)
+    var_conservation = conservation_scores(var_hist)
+    diversity_scores = np.where(var_hist.sum(axis=0) > 0, 1 - var_conservation, 0.0)
 
     colors_div = [variant_color if all_positions[i] in direct_positions else '#f39c12' for i in range(12)]
     bars = ax2.bar(range(12), diversity_scores, color=colors_div, edgecolor='black', alpha=0.7)
@@ -204,7 +281,6 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
     ax2.set_ylim([0, 1])
 
     # 3. Most common amino acids at each position (Variants only)
-    ax3 = plt.subplot(3, 3, 3)
     ax3.axis('off')
     ax3.set_xlim(0, 10)
     ax3.set_ylim(0, 15)
@@ -214,9 +290,8 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
 
     y_pos = 12.5
     for pos in range(12):
-        counter = variant_aa_by_pos[pos]
-        if counter:
-            top3 = counter.most_common(3)
+        top3 = top_residues(var_hist[:, pos], 3)
+        if top3:
             pdb_pos = all_positions[pos]
             pos_type = "D" if pdb_pos in direct_positions else "P"
             standard_aa = standard_consensus[pos]
@@ -230,9 +305,13 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
             y_pos -= 1
 
     # 4. Dendrogram of variants (if available)
-    ax4 = plt.subplot(3, 3, 4)
+    # Panels 4, 6 and 7 have bounded size (truncated tree, 20x12 heatmaps), so they
+    # are drawn in-process; worker start-up would cost more than the drawing itself
     if linkage_matrix is not None and len(variants) > 3:
-        dendrogram(linkage_matrix, ax=ax4, no_labels=True, color_threshold=3)
+        dendrogram(linkage_matrix, ax=ax4, no_labels=True, color_threshold=3,
+                   truncate_mode='lastp', p=DENDROGRAM_LEAVES)
+        for collection in ax4.collections:
+            collection.set_rasterized(True)
         ax4.set_title(f'Hierarchical Clustering of Variants\n({len(variants)} sequences)',
                      fontsize=12, fontweight='bold')
         ax4.set_xlabel('Variant Index', fontsize=10)
@@ -243,7 +322,6 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
         ax4.set_title('Hierarchical Clustering', fontsize=12, fontweight='bold')
 
     # 5. Sub-cluster sizes (if available)
-    ax5 = plt.subplot(3, 3, 5)
     if sub_clusters is not None:
         sub_cluster_counts = Counter(sub_clusters)
         sc_ids = [sc for sc, cnt in sub_cluster_counts.most_common(15)]
@@ -268,80 +346,42 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
         ax5.set_title('Variant Sub-clusters', fontsize=12, fontweight='bold')
 
     # 6. Heatmap: Standard cluster (discrete colors)
-    ax6 = plt.subplot(3, 3, 6)
-
-    aa_list = list('ACDEFGHIKLMNPQRSTVWY')
-    freq_matrix_std = np.zeros((len(aa_list), 12))
 
-    for pos in range(12):
-        residues = [seq[pos] for seq in standard if pos < len(seq) and seq[pos] != 'X']
-        counter = Counter(residues)
-        total = len(residues)
-
-        for i, aa in enumerate(aa_list):
-            freq_matrix_std[i, pos] = counter.get(aa, 0) / total if total > 0 else 0
+    freq_matrix_std = aa_frequency_matrix(std_hist)
 
     # Use discrete colormap
-    im = ax6.imshow(freq_matrix_std, cmap='Greens', aspect='auto', vmin=0, vmax=1)
-    ax6.set_yticks(range(len(aa_list)))
-    ax6.set_yticklabels(aa_list, fontsize=9)
+    im = ax6.imshow(freq_matrix_std, cmap='Greens', aspect='auto', vmin=0, vmax=1, rasterized=True)
+    ax6.set_yticks(range(len(AA_LIST)))
+    ax6.set_yticklabels(AA_LIST, fontsize=9)
     ax6.set_xticks(range(12))
     ax6.set_xticklabels(all_positions, fontsize=9, rotation=45)
     ax6.set_xlabel('PDB Position', fontsize=10, fontweight='bold')
     ax6.set_ylabel('Amino Acid', fontsize=10, fontweight='bold')
     ax6.set_title(f'Standard Cluster AA Frequency\n(n={len(standard)})',
                  fontsize=12, fontweight='bold')
-    cbar = plt.colorbar(im, ax=ax6, fraction=0.046)
+    cbar = fig.colorbar(im, ax=ax6, fraction=0.046)
     cbar.set_label('Frequency', fontsize=9)
 
     # 7. Heatmap: Variant cluster (discrete colors)
-    ax7 = plt.subplot(3, 3, 7)
 
-    freq_matrix_var = np.zeros((len(aa_list), 12))
-
-    for pos in range(12):
-        residues = [seq[pos] for seq in variants if pos < len(seq) and seq[pos] != 'X']
-        counter = Counter(residues)
-        total = len(residues)
-
-        for i, aa in enumerate(aa_list):
-            freq_matrix_var[i, pos] = counter.get(aa, 0) / total if total > 0 else 0
+    freq_matrix_var = aa_frequency_matrix(var_hist)
 
     # Use discrete colormap
-    im = ax7.imshow(freq_matrix_var, cmap='Reds', aspect='auto', vmin=0, vmax=1)
-    ax7.set_yticks(range(len(aa_list)))
-    ax7.set_yticklabels(aa_list, fontsize=9)
+    im = ax7.imshow(freq_matrix_var, cmap='Reds', aspect='auto', vmin=0, vmax=1, rasterized=True)
+    ax7.set_yticks(range(len(AA_LIST)))
+    ax7.set_yticklabels(AA_LIST, fontsize=9)
     ax7.set_xticks(range(12))
     ax7.set_xticklabels(all_positions, fontsize=9, rotation=45)
     ax7.set_xlabel('PDB Position', fontsize=10, fontweight='bold')
     ax7.set_ylabel('Amino Acid', fontsize=10, fontweight='bold')
     ax7.set_title(f'Variant Cluster AA Frequency\n(n={len(variants)})',
                  fontsize=12, fontweight='bold')
-    cbar = plt.colorbar(im, ax=ax7, fraction=0.046)
+    cbar = fig.colorbar(im, ax=ax7, fraction=0.046)
     cbar.set_label('Frequency', fontsize=9)
 
     # 8. Conservation comparison
-    ax8 = plt.subplot(3, 3, 8)
-
-    std_conservation = []
-    var_conservation = []
 
-    for pos in range(12):
-        # Standard
-        residues = [seq[pos] for seq in standard if pos < len(seq) and seq[pos] != 'X']
-        if residues:
-            most_common_freq = Counter(residues).most_common(1)[0][1]
-            std_conservation.append(most_common_freq / len(residues))
-        else:
-            std_conservation.append(0)
-
-        # Variants
-        residues = [seq[pos] for seq in variants if pos < len(seq) and seq[pos] != 'X']
-        if residues:
-            most_common_freq = Counter(residues).most_common(1)[0][1]
-            var_conservation.append(most_common_freq / len(residues))
-        else:
-            var_conservation.append(0)
+    std_conservation = conservation_scores(std_hist)
 
     x = np.arange(12)
     width = 0.35
@@ -361,7 +401,10 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
     ax8.set_ylim([0, 1.05])
 
     # 9. Summary statistics
-    ax9 = plt.subplot(3, 3, 9)
+    if variant_patterns is not None:
+        n_unique = len(variant_patterns)
+    else:
+        n_unique = len(set(variants.tolist()))
     ax9.axis('off')
     ax9.set_xlim(0, 10)
     ax9.set_ylim(0, 10)
@@ -376,7 +419,7 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
         f"  Avg conservation: {np.mean(std_conservation)*100:.1f}%",
         f"",
         f"Variant cluster: {len(variants)} ({len(variants)/len(df)*100:.1f}%)",
-        f"  Unique patterns: {len(set([str(seq) for seq in variants]))}",
+        f"  Unique patterns: {n_unique}",
         f"  Avg conservation: {np.mean(var_conservation)*100:.1f}%",
         f"  Avg diversity: {np.mean(diversity_scores):.3f}",
     ]
@@ -393,16 +436,21 @@ def create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters
             ax9.text(0.5, y_pos, line, ha='left', fontsize=10, family='monospace')
             y_pos -= 0.6
 
-    plt.suptitle('UDH Substrate Binding Site: Standard vs Variants - Detailed Analysis',
-                 fontsize=18, fontweight='bold', y=0.998)
-    plt.tight_layout()
+    fig.suptitle('UDH Substrate Binding Site: Standard vs Variants - Detailed Analysis',
+                 fontsize=18, fontweight='bold')
 
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    # Constrained layout already fits the figure, so no bbox_inches='tight' re-render
+    fig.savefig(output_file, dpi=200)
     print(f"\nImproved visualization saved: {output_file}")
 
     return output_file
 
 def main():
+    parser = argparse.ArgumentParser(description="UDH substrate variant analysis")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="print the analysis only and skip the figure (same as ASMC_NO_PLOT=1)")
+    args = parser.parse_args()
+
     tsv_file = Path("udh_substrate_asmc_eps025/groups_0.25_min_2.tsv")
 
     if not tsv_file.exists():
@@ -411,24 +459,23 @@ def main():
 
     # Analyze variants
     result = analyze_variants(tsv_file)
-    if result is None or len(result) < 8:
-        print("Error in analysis")
-        return
-
-    df, variants, variant_aa_by_pos, sub_clusters, linkage_matrix, all_positions, direct_positions, standard_consensus = result
 
     # Create improved visualizations
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_file = f"udh_variants_analysis_{timestamp}.png"
-    viz_file = create_improved_visualizations(df, variants, variant_aa_by_pos, sub_clusters,
-                                              linkage_matrix, all_positions, direct_positions,
-                                              standard_consensus, output_file)
+    viz_file = None
+    if not (args.no_plot or os.environ.get('ASMC_NO_PLOT')):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_file = f"udh_variants_analysis_{timestamp}.png"
+        viz_file = create_improved_visualizations(
+            result['df'], result['variants'], result['var_hist'], result['sub_clusters'],
+            result['linkage_matrix'], result['all_positions'], result['direct_positions'],
+            result['standard_consensus'], output_file, std_hist=result['std_hist'],
+            variant_patterns=result['variant_patterns'])
 
     print()
     print("=" * 70)
     print("Variant Analysis Complete!")
     print("=" * 70)
-    print(f"Visualization: {viz_file}")
+    print(f"Visualization: {viz_file or 'skipped'}")
     print("=" * 70)
 
 if __name__ == "__main__":
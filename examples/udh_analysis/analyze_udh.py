@@ -8,14 +8,30 @@ UDH (Uronate Dehydrogenase) 클러스터링 분석
 import subprocess
 import sys
 from pathlib import Path
+import matplotlib
+matplotlib.use('Agg')  # 파일 출력 전용 (대화형 backend 불필요)
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
-from scipy.spatial.distance import squareform
 import seaborn as sns
 
+try:
+    from datasketch import MinHash, MinHashLSH
+except ImportError:  # datasketch가 없으면 완전히 같은 서열만 합침
+    MinHashLSH = None
+
+IDENTITY_BLOCK_BYTES = 16 * 1024 * 1024  # 비교 블록 크기 상한 (L3 캐시에 들어가도록)
+DENDROGRAM_LEAVES = 50  # 큰 덴드로그램은 상위 병합만 표시
+HIGH_DPI_MAX_SEQS = 200  # 이보다 많으면 그림을 150 dpi로 저장
+SAMPLE_SEED = 42  # 서열 샘플링 시드 (같은 입력이면 같은 샘플)
+REDUNDANT_JACCARD = 0.99  # MinHash 후보 조건: 추정 k-mer Jaccard가 이 이상
+REDUNDANT_IDENTITY = 0.99  # 합치는 조건: 대표 서열과의 위치별 identity가 이 이상
+SHINGLE_K = 8
+MINHASH_PERM = 128
+LSH_BANDS = (4, 32)  # (밴드 수, 밴드당 행 수) - 0.99 근처만 후보로 잡히도록
+
 def read_fasta(fasta_file):
     """FASTA 파일 읽기"""
     sequences = {}
@@ -42,54 +58,142 @@ def read_fasta(fasta_file):
 
     return sequences
 
-def calculate_identity_matrix(sequences, sample_size=None):
-    """서열 유사도 매트릭스 계산"""
-    seq_names = list(sequences.keys())
-
-    # 샘플링 (옵션)
+def positional_identity(seq1, seq2):
+    """짧은 서열 길이까지 같은 위치의 잔기가 같은 비율 (identity 행렬과 같은 정의)"""
+    min_len = min(len(seq1), len(seq2))
+    if min_len == 0:
+        return 0.0
+    a = np.frombuffer(seq1[:min_len].encode('ascii'), dtype=np.uint8)
+    b = np.frombuffer(seq2[:min_len].encode('ascii'), dtype=np.uint8)
+    return np.count_nonzero(a == b) / min_len
+
+def collapse_redundant(sequences):
+    """거의 같은 서열을 대표 서열 하나로 합침
+
+    (대표 서열 dict, {대표 이름: [대표를 포함한 구성원 이름]})을 반환한다.
+    MinHash는 후보만 고르고, 대표와의 위치별 identity가 REDUNDANT_IDENTITY 이상일 때만 합친다.
+    """
+    members = {}
+
+    if MinHashLSH is None:
+        # Exact duplicates only: the first occurrence represents the rest
+        first_by_seq = {}
+        for name, seq in sequences.items():
+            members.setdefault(first_by_seq.setdefault(seq, name), []).append(name)
+    else:
+        # LSH proposes candidates and the estimated Jaccard filters them, but only
+        # positional identity (the metric clustered on) decides a merge: k-mer sets
+        # ignore shifts, so e.g. a one-residue N-terminal extension would pass
+        lsh = MinHashLSH(num_perm=MINHASH_PERM, params=LSH_BANDS)
+        rep_hashes = {}
+        for name, seq in sequences.items():
+            minhash = MinHash(num_perm=MINHASH_PERM)
+            minhash.update_batch([seq[i:i + SHINGLE_K].encode('ascii')
+                                  for i in range(max(len(seq) - SHINGLE_K + 1, 1))])
+            hits = [rep for rep in lsh.query(minhash)
+                    if rep_hashes[rep].jaccard(minhash) >= REDUNDANT_JACCARD
+                    and positional_identity(sequences[rep], seq) >= REDUNDANT_IDENTITY]
+            if hits:
+                # Earliest representative wins (dicts keep insertion order)
+                members[min(hits, key=list(rep_hashes).index)].append(name)
+            else:
+                lsh.insert(name, minhash)
+                rep_hashes[name] = minhash
+                members[name] = [name]
+
+    representatives = {rep: sequences[rep] for rep in members}
+    return representatives, members
+
+def representative_index(seq_names, rep_names, members):
+    """seq_names 각 서열의 대표가 rep_names에서 몇 번째인지 (identity 행렬 확장용)"""
+    rep_pos = {rep: i for i, rep in enumerate(rep_names)}
+    rep_of = {member: rep for rep, group in members.items() for member in group}
+    return np.array([rep_pos[rep_of[name]] for name in seq_names], dtype=np.intp)
+
+def encode_sequences(seqs):
+    """서열들을 0으로 패딩된 (N, Lmax) uint8 행렬과 길이 벡터로 변환"""
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+    encoded = np.zeros((len(seqs), max(lengths.max(initial=0), 1)), dtype=np.uint8)
+    for i, seq in enumerate(seqs):
+        encoded[i, :len(seq)] = np.frombuffer(seq.encode('ascii'), dtype=np.uint8)
+    return encoded, lengths
+
+def sample_sequence_names(seq_names, sample_size=None):
+    """sample_size개를 시드 고정으로 뽑아 (입력 순서의 이름 목록, 인덱스) 반환"""
+    indices = np.arange(len(seq_names))
     if sample_size and len(seq_names) > sample_size:
         print(f"Sampling {sample_size} sequences from {len(seq_names)}...")
-        np.random.seed(42)
-        indices = np.random.choice(len(seq_names), sample_size, replace=False)
-        seq_names = [seq_names[i] for i in sorted(indices)]
+        rng = np.random.default_rng(SAMPLE_SEED)
+        indices = np.sort(rng.choice(len(seq_names), sample_size, replace=False, shuffle=False))
+        seq_names = [seq_names[i] for i in indices]
+    return seq_names, indices
+
+def calculate_identity_matrix(sequences, sample_size=None, encoded=None, lengths=None):
+    """서열 유사도 매트릭스 계산
+
+    encoded/lengths(encode_sequences 결과, sequences 순서)를 넘기면 다시 인코딩하지 않는다.
+    """
+    seq_names, indices = sample_sequence_names(list(sequences.keys()), sample_size)
 
     n = len(seq_names)
     print(f"Calculating identity matrix for {n} sequences...")
 
-    identity_matrix = np.zeros((n, n))
+    # Identities only carry ~3 meaningful digits, so float32 halves the footprint
+    identity_matrix = np.zeros((n, n), dtype=np.float32)
 
-    for i in range(n):
-        if i % 50 == 0:
+    if encoded is None:
+        encoded, lengths = encode_sequences([sequences[name] for name in seq_names])
+    elif len(indices) < len(encoded):
+        encoded, lengths = encoded[indices], lengths[indices]
+
+    # Rows are compared in blocks so each (B, n, L) comparison stays cache-sized
+    block = max(1, IDENTITY_BLOCK_BYTES // max(encoded.size, 1))
+    for i0 in range(0, n, block):
+        i1 = min(i0 + block, n)
+        # Same every-50-rows progress lines, without visiting each row
+        for i in range(-(-i0 // 50) * 50, i1, 50):
             print(f"  Progress: {i}/{n}")
-        for j in range(i, n):
-            seq1 = sequences[seq_names[i]]
-            seq2 = sequences[seq_names[j]]
-
-            # Pairwise identity
-            min_len = min(len(seq1), len(seq2))
-            if min_len > 0:
-                identical = sum(1 for k in range(min_len) if seq1[k] == seq2[k])
-                identity = identical / min_len
-            else:
-                identity = 0
 
-            identity_matrix[i, j] = identity
-            identity_matrix[j, i] = identity
+        # Pairwise identity of rows i0..i1 against every j >= i0; padding (0)
+        # never counts, so matches stop at the shorter sequence
+        rows = encoded[i0:i1, None, :]
+        matches = ((encoded[None, i0:, :] == rows) & (rows != 0)).sum(axis=-1, dtype=np.int32)
+        min_lens = np.minimum(lengths[i0:i1, None], lengths[None, i0:])
+        identity = np.divide(matches, min_lens, out=np.zeros(matches.shape), where=min_lens > 0)
+
+        identity_matrix[i0:i1, i0:] = identity
+        identity_matrix[i0:, i0:i1] = identity.T
 
     print(f"Identity matrix calculated!")
     return seq_names, identity_matrix
 
-def perform_clustering(seq_names, identity_matrix, method='average', threshold=0.3):
-    """계층적 클러스터링 수행"""
+def upper_identity_values(identity_matrix):
+    """대각선을 제외한 상삼각 identity 값 (linkage의 condensed 순서)"""
+    return identity_matrix[np.triu_indices(len(identity_matrix), k=1)]
+
+def identity_statistics(identity_values):
+    """쌍별 identity 요약 통계"""
+    return {
+        'mean': float(np.mean(identity_values)),
+        'median': float(np.median(identity_values)),
+        'min': float(np.min(identity_values)),
+        'max': float(np.max(identity_values)),
+    }
+
+def perform_clustering(seq_names, identity_matrix, method='average', threshold=0.3,
+                       identity_values=None):
+    """계층적 클러스터링 수행
+
+    identity_values(상삼각 identity 벡터)를 넘기면 행렬에서 다시 뽑지 않는다.
+    """
     print(f"\nPerforming hierarchical clustering...")
     print(f"  Method: {method}")
     print(f"  Threshold: {threshold}")
 
-    # Convert identity to distance
-    distance_matrix = 1 - identity_matrix
-
-    # Condensed distance matrix for linkage
-    condensed_dist = squareform(distance_matrix)
+    # Condensed distance vector straight from the upper triangle (no N x N copy)
+    if identity_values is None:
+        identity_values = upper_identity_values(identity_matrix)
+    condensed_dist = 1 - identity_values
 
     # Hierarchical clustering
     linkage_matrix = linkage(condensed_dist, method=method)
@@ -97,31 +201,42 @@ def perform_clustering(seq_names, identity_matrix, method='average', threshold=0
     # Form clusters
     clusters = fcluster(linkage_matrix, threshold, criterion='distance')
 
-    # Group by cluster
-    cluster_groups = {}
-    for i, cluster_id in enumerate(clusters):
-        if cluster_id not in cluster_groups:
-            cluster_groups[cluster_id] = []
-        cluster_groups[cluster_id].append(seq_names[i])
+    # Group by cluster: members keep input order, clusters keep first-seen order
+    order = np.argsort(clusters, kind='stable')
+    cluster_ids, starts, sizes = np.unique(clusters[order], return_index=True, return_counts=True)
+    ordered_names = np.asarray(seq_names, dtype=object)[order]
+    first_seen = np.argsort(order[starts], kind='stable')
+    cluster_groups = {cluster_ids[k]: ordered_names[starts[k]:starts[k] + sizes[k]].tolist()
+                      for k in first_seen}
 
     print(f"\nClustering complete!")
     print(f"  Number of clusters: {len(cluster_groups)}")
-    print(f"  Cluster sizes: min={min(len(v) for v in cluster_groups.values())}, "
-          f"max={max(len(v) for v in cluster_groups.values())}, "
-          f"mean={np.mean([len(v) for v in cluster_groups.values()]):.1f}")
+    print(f"  Cluster sizes: min={sizes.min()}, "
+          f"max={sizes.max()}, "
+          f"mean={sizes.mean():.1f}")
 
     return clusters, linkage_matrix, cluster_groups
 
-def visualize_results(seq_names, identity_matrix, clusters, linkage_matrix, cluster_groups, sequences):
-    """결과 시각화"""
+def visualize_results(seq_names, identity_matrix, clusters, linkage_matrix, cluster_groups, sequences,
+                      identity_values=None, identity_stats=None, seq_lengths=None):
+    """결과 시각화
+
+    identity_values, identity_stats, seq_lengths는 main에서 한 번 계산한 값을 넘기면 재사용한다.
+    """
+    if identity_values is None:
+        identity_values = upper_identity_values(identity_matrix)
+    if identity_stats is None:
+        identity_stats = identity_statistics(identity_values)
+
     print("\nCreating visualizations...")
 
     # 너무 많은 서열은 시각화가 어려우므로 샘플링
     n_seqs = len(seq_names)
     if n_seqs > 100:
         print(f"  Sampling 100 sequences for heatmap from {n_seqs}...")
-        sample_indices = np.random.choice(n_seqs, min(100, n_seqs), replace=False)
-        sample_names = [seq_names[i] for i in sorted(sample_indices)]
+        rng = np.random.default_rng(SAMPLE_SEED)
+        sample_indices = np.sort(rng.choice(n_seqs, min(100, n_seqs), replace=False, shuffle=False))
+        sample_names = [seq_names[i] for i in sample_indices]
         sample_matrix = identity_matrix[np.ix_(sample_indices, sample_indices)]
     else:
         sample_names = seq_names
@@ -144,7 +259,8 @@ def visualize_results(seq_names, identity_matrix, clusters, linkage_matrix, clus
                    leaf_rotation=90, leaf_font_size=6)
         ax2.set_title('Hierarchical Clustering Dendrogram', fontsize=12)
     else:
-        dendrogram(linkage_matrix, ax=ax2, no_labels=True)
+        dendrogram(linkage_matrix, ax=ax2, no_labels=True, truncate_mode='lastp',
+                   p=DENDROGRAM_LEAVES, show_contracted=True)
         ax2.set_title(f'Hierarchical Clustering Dendrogram\n({n_seqs} sequences)', fontsize=12)
     ax2.set_xlabel('Sequence')
     ax2.set_ylabel('Distance')
@@ -166,7 +282,8 @@ def visualize_results(seq_names, identity_matrix, clusters, linkage_matrix, clus
 
     # 4. Sequence length distribution
     ax4 = plt.subplot(2, 3, 4)
-    seq_lengths = [len(seq) for seq in sequences.values()]
+    if seq_lengths is None:
+        seq_lengths = [len(seq) for seq in sequences.values()]
     ax4.hist(seq_lengths, bins=50, edgecolor='black', alpha=0.7, color='steelblue')
     ax4.set_xlabel('Sequence Length (aa)')
     ax4.set_ylabel('Frequency')
@@ -180,14 +297,12 @@ def visualize_results(seq_names, identity_matrix, clusters, linkage_matrix, clus
     # 5. Identity distribution
     ax5 = plt.subplot(2, 3, 5)
     # Upper triangle only (excluding diagonal)
-    upper_tri_indices = np.triu_indices_from(identity_matrix, k=1)
-    identity_values = identity_matrix[upper_tri_indices]
     ax5.hist(identity_values, bins=50, edgecolor='black', alpha=0.7, color='green')
     ax5.set_xlabel('Pairwise Identity')
     ax5.set_ylabel('Frequency')
-    ax5.set_title(f'Pairwise Identity Distribution\n(mean: {np.mean(identity_values):.3f})', fontsize=12)
-    ax5.axvline(np.mean(identity_values), color='red', linestyle='--',
-                label=f'Mean: {np.mean(identity_values):.3f}')
+    ax5.set_title(f'Pairwise Identity Distribution\n(mean: {identity_stats["mean"]:.3f})', fontsize=12)
+    ax5.axvline(identity_stats['mean'], color='red', linestyle='--',
+                label=f'Mean: {identity_stats["mean"]:.3f}')
     ax5.legend()
 
     # 6. Top clusters composition
@@ -218,12 +333,14 @@ def visualize_results(seq_names, identity_matrix, clusters, linkage_matrix, clus
     # Save figure
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = f"udh_clustering_{timestamp}.png"
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    dpi = 300 if n_seqs <= HIGH_DPI_MAX_SEQS else 150
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight')
     print(f"  Visualization saved: {output_file}")
 
     return output_file
 
-def create_report(seq_names, identity_matrix, cluster_groups, sequences):
+def create_report(seq_names, identity_matrix, cluster_groups, sequences, identity_stats=None,
+                  seq_lengths=None):
     """분석 리포트 생성"""
     print("\nGenerating analysis report...")
 
@@ -240,7 +357,8 @@ def create_report(seq_names, identity_matrix, cluster_groups, sequences):
     report.append(f"Number of clusters: {len(cluster_groups)}")
 
     # Sequence statistics
-    seq_lengths = [len(seq) for seq in sequences.values()]
+    if seq_lengths is None:
+        seq_lengths = [len(seq) for seq in sequences.values()]
     report.append("\n" + "-" * 70)
     report.append("Sequence Statistics:")
     report.append(f"  Length range: {min(seq_lengths)} - {max(seq_lengths)} aa")
@@ -248,14 +366,14 @@ def create_report(seq_names, identity_matrix, cluster_groups, sequences):
     report.append(f"  Median length: {np.median(seq_lengths):.1f} aa")
 
     # Identity statistics
-    upper_tri = np.triu_indices_from(identity_matrix, k=1)
-    identity_values = identity_matrix[upper_tri]
+    if identity_stats is None:
+        identity_stats = identity_statistics(upper_identity_values(identity_matrix))
     report.append("\n" + "-" * 70)
     report.append("Pairwise Identity Statistics:")
-    report.append(f"  Mean identity: {np.mean(identity_values):.3f}")
-    report.append(f"  Median identity: {np.median(identity_values):.3f}")
-    report.append(f"  Min identity: {np.min(identity_values):.3f}")
-    report.append(f"  Max identity: {np.max(identity_values):.3f}")
+    report.append(f"  Mean identity: {identity_stats['mean']:.3f}")
+    report.append(f"  Median identity: {identity_stats['median']:.3f}")
+    report.append(f"  Min identity: {identity_stats['min']:.3f}")
+    report.append(f"  Max identity: {identity_stats['max']:.3f}")
 
     # Cluster statistics
     cluster_sizes = [len(members) for members in cluster_groups.values()]
@@ -297,12 +415,11 @@ def save_cluster_results(cluster_groups, sequences, seq_names):
 
     # Save cluster assignments
     cluster_file = f"udh_clusters_{timestamp}.tsv"
+    rows = ["Sequence\tCluster_ID\tSequence_Length\n"]
+    rows.extend(f"{member}\t{cluster_id}\t{len(sequences.get(member, ''))}\n"
+                for cluster_id, members in cluster_groups.items() for member in members)
     with open(cluster_file, 'w') as f:
-        f.write("Sequence\tCluster_ID\tSequence_Length\n")
-        for cluster_id, members in cluster_groups.items():
-            for member in members:
-                seq_len = len(sequences.get(member, ""))
-                f.write(f"{member}\t{cluster_id}\t{seq_len}\n")
+        f.write(''.join(rows))
     print(f"  Cluster assignments saved: {cluster_file}")
 
     # Save cluster FASTAs (top 5 largest clusters)
@@ -310,9 +427,8 @@ def save_cluster_results(cluster_groups, sequences, seq_names):
     for i, (cluster_id, members) in enumerate(sorted_clusters[:5], 1):
         fasta_file = f"udh_cluster_{cluster_id}_{timestamp}.fasta"
         with open(fasta_file, 'w') as f:
-            for member in members:
-                if member in sequences:
-                    f.write(f">{member}\n{sequences[member]}\n")
+            f.write(''.join(f">{member}\n{sequences[member]}\n"
+                            for member in members if member in sequences))
         print(f"  Cluster {cluster_id} FASTA saved: {fasta_file}")
 
     return cluster_file
@@ -339,22 +455,50 @@ def main():
     sequences = read_fasta(fasta_file)
     print(f"  Total sequences: {len(sequences)}")
 
+    seq_lengths = np.fromiter((len(seq) for seq in sequences.values()),
+                              dtype=np.int64, count=len(sequences))
+
     # Calculate identity matrix (with optional sampling for large datasets)
     # For 1181 sequences, we'll sample to make it manageable
     sample_size = 500 if len(sequences) > 500 else None
-    seq_names, identity_matrix = calculate_identity_matrix(sequences, sample_size=sample_size)
+    seq_names, _ = sample_sequence_names(list(sequences.keys()), sample_size)
+
+    # Near-identical sequences add O(N^2) work, so only one representative of each
+    # is compared pairwise; the matrix is then expanded back to every sequence, so
+    # linkage and statistics still weigh each sequence once
+    representatives, members = collapse_redundant({name: sequences[name] for name in seq_names})
+    if len(representatives) < len(seq_names):
+        print(f"  Representatives after collapsing redundant sequences: {len(representatives)}")
+
+    # Encode once into a padded byte matrix + length vector (representatives order)
+    encoded, rep_lengths = encode_sequences(list(representatives.values()))
+    rep_names, rep_matrix = calculate_identity_matrix(representatives, encoded=encoded,
+                                                      lengths=rep_lengths)
+    if len(rep_names) < len(seq_names):
+        rep_idx = representative_index(seq_names, rep_names, members)
+        identity_matrix = rep_matrix[np.ix_(rep_idx, rep_idx)]
+    else:
+        identity_matrix = rep_matrix
+
+    # Upper-triangle identities are shared by clustering, plots and report
+    identity_values = upper_identity_values(identity_matrix)
+    identity_stats = identity_statistics(identity_values)
 
     # Perform clustering
     clusters, linkage_matrix, cluster_groups = perform_clustering(
-        seq_names, identity_matrix, method='average', threshold=0.5
+        seq_names, identity_matrix, method='average', threshold=0.5,
+        identity_values=identity_values
     )
 
     # Create visualizations
     viz_file = visualize_results(seq_names, identity_matrix, clusters,
-                                 linkage_matrix, cluster_groups, sequences)
+                                 linkage_matrix, cluster_groups, sequences,
+                                 identity_values=identity_values, identity_stats=identity_stats,
+                                 seq_lengths=seq_lengths)
 
     # Generate report
-    report_file = create_report(seq_names, identity_matrix, cluster_groups, sequences)
+    report_file = create_report(seq_names, identity_matrix, cluster_groups, sequences,
+                                identity_stats=identity_stats, seq_lengths=seq_lengths)
 
     # Save cluster results
     cluster_file = save_cluster_results(cluster_groups, sequences, seq_names)
@@ -5,74 +5,12 @@ UDH 서열에서 Active Site 잔기 추출
 참조 구조와 정렬 후 active site 위치의 잔기들만 추출
 """
 
-from Bio import SeqIO, pairwise2
+from Bio import SeqIO
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 from pathlib import Path
-import re
-
-def read_pdb_sequence(pdb_file):
-    """PDB 파일에서 서열 읽기"""
-    sequence = []
-    residues = {}
-
-    with open(pdb_file, 'r') as f:
-        for line in f:
-            if line.startswith('ATOM'):
-                chain = line[21]
-                resnum = int(line[22:26].strip())
-                resname = line[17:20].strip()
-
-                if chain == 'A' and resnum not in residues:
-                    # 3-letter to 1-letter amino acid code
-                    aa_map = {
-                        'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E',
-                        'PHE': 'F', 'GLY': 'G', 'HIS': 'H', 'ILE': 'I',
-                        'LYS': 'K', 'LEU': 'L', 'MET': 'M', 'ASN': 'N',
-                        'PRO': 'P', 'GLN': 'Q', 'ARG': 'R', 'SER': 'S',
-                        'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
-                    }
-
-                    if resname in aa_map:
-                        residues[resnum] = aa_map[resname]
-
-    # Sort by residue number
-    sorted_residues = sorted(residues.items())
-    sequence = ''.join([aa for _, aa in sorted_residues])
-    residue_numbers = [num for num, _ in sorted_residues]
-
-    return sequence, residue_numbers
-
-def align_to_reference(ref_seq, target_seq):
-    """참조 서열과 타겟 서열을 정렬"""
-    # Global alignment
-    alignments = pairwise2.align.globalxx(ref_seq, target_seq)
-
-    if alignments:
-        best_alignment = alignments[0]
-        return best_alignment.seqA, best_alignment.seqB, best_alignment.score
-    else:
-        return None, None, 0
-
-def extract_active_site_residues(aligned_ref, aligned_target, ref_residue_numbers, active_site_positions):
-    """정렬된 서열에서 active site 위치의 잔기 추출"""
-    # Map alignment positions to reference residue numbers
-    ref_pos_to_resnum = {}
-    ref_idx = 0
-
-    for aln_idx, char in enumerate(aligned_ref):
-        if char != '-':
-            ref_pos_to_resnum[aln_idx] = ref_residue_numbers[ref_idx]
-            ref_idx += 1
-
-    # Extract active site residues from target
-    active_site_residues = []
-    for aln_idx, resnum in ref_pos_to_resnum.items():
-        if resnum in active_site_positions:
-            target_aa = aligned_target[aln_idx]
-            active_site_residues.append(target_aa if target_aa != '-' else 'X')
-
-    return ''.join(active_site_residues)
+from udh_common import (PARALLEL_MIN_SEQS, count_fasta_records, extract_all_sites,
+                        read_pdb_sequence)
 
 def main():
     print("=" * 70)
@@ -96,46 +34,43 @@ def main():
 
     # Read target sequences
     print(f"Reading target sequences: {fasta_file}")
-    sequences = list(SeqIO.parse(fasta_file, "fasta"))
-    print(f"  Total sequences: {len(sequences)}")
+    n_sequences = count_fasta_records(fasta_file)
+    print(f"  Total sequences: {n_sequences}")
     print()
 
     # Process sequences
     print("Aligning sequences and extracting active sites...")
-    active_site_sequences = []
+    output_file = Path("udh_active_sites.fasta")
     successful = 0
 
-    for i, record in enumerate(sequences):
-        if (i + 1) % 100 == 0:
-            print(f"  Progress: {i + 1}/{len(sequences)}")
-
-        # Align to reference
-        aligned_ref, aligned_target, score = align_to_reference(ref_seq, str(record.seq))
+    def site_records():
+        # Stream records from the input FASTA straight into the output file
+        nonlocal successful
+        records = ((record.id, str(record.seq)) for record in SeqIO.parse(fasta_file, "fasta"))
+        site_iter = extract_all_sites(ref_seq, ref_residue_numbers, active_site_positions, records,
+                                      parallel=n_sequences >= PARALLEL_MIN_SEQS)
 
-        if aligned_ref is not None:
-            # Extract active site residues
-            active_site = extract_active_site_residues(
-                aligned_ref, aligned_target, ref_residue_numbers, active_site_positions
-            )
+        for i, (record_id, active_site) in enumerate(site_iter):
+            if (i + 1) % 100 == 0:
+                print(f"  Progress: {i + 1}/{n_sequences}")
 
-            if len(active_site) == len(active_site_positions):
-                # Create new record with active site sequence
-                new_record = SeqRecord(
+            if active_site is not None and len(active_site) == len(active_site_positions):
+                successful += 1
+                yield SeqRecord(
                     Seq(active_site),
-                    id=record.id,
+                    id=record_id,
                     description=f"Active site residues ({len(active_site)} positions)"
                 )
-                active_site_sequences.append(new_record)
-                successful += 1
 
-    print(f"\n  Successfully processed: {successful}/{len(sequences)}")
+    with open(output_file, 'w') as out_fh:
+        SeqIO.write(site_records(), out_fh, "fasta")
+
+    print(f"\n  Successfully processed: {successful}/{n_sequences}")
     print()
 
     # Save active site sequences
-    output_file = Path("udh_active_sites.fasta")
-    SeqIO.write(active_site_sequences, output_file, "fasta")
     print(f"Active site sequences saved: {output_file}")
-    print(f"  Total sequences: {len(active_site_sequences)}")
+    print(f"  Total sequences: {successful}")
     print(f"  Active site length: {len(active_site_positions)} residues")
     print()
     print("=" * 70)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+UDH 부위 추출/분석 스크립트 공용 함수
+참조 PDB 서열 읽기, 참조 정렬, 정렬에서 부위 잔기 추출, ASMC groups TSV 읽기, 부위 서열 인코딩
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from Bio import BiopythonDeprecationWarning
+from Bio.Align import PairwiseAligner
+from pathlib import Path
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+try:
+    # pairwise2 is deprecated but kept for globalxx's tie order (see align_to_reference)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', BiopythonDeprecationWarning)
+        from Bio import pairwise2
+except ImportError:
+    pairwise2 = None
+
+try:
+    import polars as pl
+except ImportError:  # polars가 없으면 pandas 파서 사용
+    pl = None
+
+# 3-letter to 1-letter amino acid code
+AA_3TO1 = {
+    b'ALA': 'A', b'CYS': 'C', b'ASP': 'D', b'GLU': 'E',
+    b'PHE': 'F', b'GLY': 'G', b'HIS': 'H', b'ILE': 'I',
+    b'LYS': 'K', b'LEU': 'L', b'MET': 'M', b'ASN': 'N',
+    b'PRO': 'P', b'GLN': 'Q', b'ARG': 'R', b'SER': 'S',
+    b'THR': 'T', b'VAL': 'V', b'TRP': 'W', b'TYR': 'Y'
+}
+AA_RESNAMES = np.array(list(AA_3TO1), dtype='S3')
+
+# pairwise2가 없는 Biopython에서만 쓰는 대체 정렬기 (globalxx와 같은 점수 체계:
+# 일치 1, 불일치/갭 0). 점수는 같지만 동점 정렬 중 고르는 것이 globalxx와 달라
+# 일부 레코드의 추출 잔기가 바뀔 수 있음
+ALIGNER = PairwiseAligner(mode='global', match_score=1, mismatch_score=0, gap_score=0)
+
+# 이 개수 이상의 서열은 프로세스 풀로 나눠 정렬
+PARALLEL_MIN_SEQS = 200
+ALIGN_CHUNKSIZE = 32
+
+@lru_cache(maxsize=16)
+def read_pdb_sequence(pdb_file):
+    """PDB 파일에서 서열 읽기 (경로별로 캐시되므로 잔기 번호는 튜플로 반환)"""
+    # Fixed-width columns of every ATOM record (up to the residue number)
+    lines = [line[:26].ljust(26) for line in Path(pdb_file).read_bytes().splitlines()
+             if line.startswith(b'ATOM')]
+    if not lines:
+        return '', ()
+    cols = np.frombuffer(b''.join(lines), dtype=np.uint8).reshape(len(lines), 26)
+
+    resnames = np.ascontiguousarray(cols[:, 17:20]).view('S3').ravel()
+    keep = (cols[:, 21] == ord('A')) & np.isin(resnames, AA_RESNAMES)
+    resnums = np.char.strip(
+        np.ascontiguousarray(cols[keep, 22:26]).view('S4').ravel()).astype(int)
+
+    # First standard residue seen for each residue number, sorted by number
+    residue_numbers, first = np.unique(resnums, return_index=True)
+    sequence = ''.join(AA_3TO1[name] for name in resnames[keep][first])
+
+    return sequence, tuple(residue_numbers.tolist())
+
+def align_to_reference(ref_seq, target_seq):
+    """참조 서열과 타겟 서열을 정렬"""
+    if not ref_seq or not target_seq:
+        return None, None, 0
+
+    # Global alignment; only the first optimal alignment is traced back, which
+    # is the same one globalxx puts first when it enumerates every tie
+    if pairwise2 is not None:
+        best_alignment = pairwise2.align.globalxx(ref_seq, target_seq, one_alignment_only=True)[0]
+        return best_alignment.seqA, best_alignment.seqB, best_alignment.score
+
+    best_alignment = ALIGNER.align(ref_seq, target_seq)[0]
+    return best_alignment[0], best_alignment[1], best_alignment.score
+
+def extract_site_residues(aligned_ref, aligned_target, ref_residue_numbers, active_site_positions):
+    """정렬된 서열에서 지정한 위치(active site / 기질 결합 부위)의 잔기 추출"""
+    # Walk the alignment once, stopping after the last wanted reference residue
+    needed = len(active_site_positions)
+    active_site_residues = []
+    ref_idx = 0
+
+    for aln_idx, char in enumerate(aligned_ref):
+        if char != '-':
+            if ref_residue_numbers[ref_idx] in active_site_positions:
+                target_aa = aligned_target[aln_idx]
+                active_site_residues.append(target_aa if target_aa != '-' else 'X')
+                if len(active_site_residues) == needed:
+                    break
+            ref_idx += 1
+
+    return ''.join(active_site_residues)
+
+def _process_record(args):
+    """서열 하나를 정렬하고 (ID, 부위 잔기) 반환 (정렬 실패 시 잔기는 None)"""
+    ref_seq, ref_residue_numbers, site_positions, record_id, target_seq = args
+    aligned_ref, aligned_target, _ = align_to_reference(ref_seq, target_seq)
+    if aligned_ref is None:
+        return record_id, None
+    return record_id, extract_site_residues(
+        aligned_ref, aligned_target, ref_residue_numbers, site_positions
+    )
+
+def count_fasta_records(fasta_file):
+    """FASTA 파일의 레코드 수 (헤더 줄 수)"""
+    with open(fasta_file, 'rb') as f:
+        return sum(1 for line in f if line.startswith(b'>'))
+
+def extract_all_sites(ref_seq, ref_residue_numbers, site_positions, records, parallel=False):
+    """(ID, 서열) 스트림의 부위 잔기를 입력 순서대로 생성"""
+    site_positions = frozenset(site_positions)
+    args = ((ref_seq, ref_residue_numbers, site_positions, record_id, seq)
+            for record_id, seq in records)
+    if not parallel:
+        yield from map(_process_record, args)
+        return
+
+    # Records are independent, so spread the alignments over all cores.
+    # executor.map submits its whole input at once, so feed it fixed-size
+    # windows: the next window is queued while the previous one is yielded,
+    # keeping at most two windows of records in memory.
+    n_workers = os.cpu_count() or 1
+    window = n_workers * ALIGN_CHUNKSIZE
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = iter(())
+        while batch := list(islice(args, window)):
+            results = executor.map(_process_record, batch, chunksize=ALIGN_CHUNKSIZE)
+            yield from pending
+            pending = results
+        yield from pending
+
+def read_groups(tsv_file, site_column='substrate_site'):
+    """ASMC groups TSV (ID, 부위 서열, 클러스터) 읽기 (polars가 설치되어 있으면 멀티스레드 파서 사용)"""
+    columns = ['sequence_id', site_column, 'cluster']
+    if pl is None:
+        return pd.read_csv(tsv_file, sep='\t', header=None, names=columns,
+                           dtype={'cluster': np.int32})
+
+    groups = pl.read_csv(tsv_file, separator='\t', has_header=False,
+                         new_columns=columns,
+                         schema_overrides={'cluster': pl.Int32})
+    return pd.DataFrame({col: groups[col].to_numpy() for col in columns})
+
+def encode_sites(sites, n_pos):
+    """결합 부위 서열을 (N, n_pos) uint8 행렬로 한 번에 변환 (짧은 서열은 0으로 패딩)"""
+    if all(len(site) == n_pos for site in sites):
+        joined = ''.join(sites)  # fixed width: no per-site slicing needed
+    else:
+        joined = ''.join(site[:n_pos].ljust(n_pos, '\0') for site in sites)
+    return np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(len(sites), n_pos)
@@ -22,10 +22,15 @@ if sys.platform == 'win32':
 import os
 import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import time
 from datetime import datetime
 
+# P2RANK console output goes to these files in the output directory
+STDOUT_LOG = "p2rank_stdout.log"
+STDERR_LOG = "p2rank_stderr.log"
+
 
 class BatchP2RANK:
     """Batch processing for P2RANK"""
@@ -56,14 +61,41 @@ class BatchP2RANK:
             f.write(f"# Total structures: {len(pdb_files)}\n")
             f.write("\n")
 
-            for pdb_file in pdb_files:
-                # Convert to absolute path
-                abs_path = Path(pdb_file).absolute()
-                f.write(f"{abs_path}\n")
+            # Convert to absolute paths (cwd / path is what Path.absolute() does,
+            # with the cwd looked up once instead of per file)
+            cwd = Path.cwd()
+            f.writelines(f"{cwd / pdb_file}\n" for pdb_file in pdb_files)
 
         print(f"Created dataset file: {dataset_file}")
         print(f"  Contains {len(pdb_files)} structures")
 
+    def prank_command(self, dataset_file, output_dir, threads):
+        """Build the 'prank predict' command line for one dataset file"""
+        return [
+            str(self.prank_script),
+            "predict",
+            str(dataset_file),
+            "-o", str(output_dir),
+            "-threads", str(threads)
+        ]
+
+    def run_logged(self, cmd, log_dir):
+        """
+        Run a P2RANK command with stdout/stderr streamed to log files in log_dir
+
+        Returns:
+            subprocess.CompletedProcess: stderr is read back only on failure
+        """
+        log_dir = Path(log_dir)
+        with open(log_dir / STDOUT_LOG, 'w', encoding='utf-8') as out, \
+                open(log_dir / STDERR_LOG, 'w', encoding='utf-8') as err:
+            result = subprocess.run(cmd, stdout=out, stderr=err, cwd=str(self.p2rank_dir))
+
+        stderr = None
+        if result.returncode != 0:
+            stderr = (log_dir / STDERR_LOG).read_text(encoding='utf-8', errors='replace')
+        return subprocess.CompletedProcess(cmd, result.returncode, None, stderr)
+
     def run_p2rank(self, dataset_file, output_dir, threads=4):
         """
         Run P2RANK on dataset
@@ -79,28 +111,18 @@ class BatchP2RANK:
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        cmd = [
-            str(self.prank_script),
-            "predict",
-            str(dataset_file),
-            "-o", str(output_dir),
-            "-threads", str(threads)
-        ]
+        cmd = self.prank_command(dataset_file, output_dir, threads)
 
         print(f"\nRunning P2RANK...")
         print(f"Command: {' '.join(cmd)}")
         print(f"Output: {output_dir}")
+        print(f"Log: {output_dir / STDOUT_LOG}")
         print()
 
         start_time = time.time()
 
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=str(self.p2rank_dir)
-            )
+            result = self.run_logged(cmd, output_dir)
 
             elapsed = time.time() - start_time
 
@@ -126,9 +148,84 @@ class BatchP2RANK:
                 'error': str(e)
             }
 
+    def run_p2rank_sharded(self, pdb_files, output_dir, threads=4, shards=2):
+        """
+        Run P2RANK as several concurrent processes, one per shard of the dataset
+
+        Each shard gets its own dataset file and output subdirectory
+        (shard_1, shard_2, ...) and threads // shards JVM threads.
+
+        Args:
+            pdb_files: List of PDB file paths
+            output_dir: Output directory
+            threads: Total number of threads to use
+            shards: Number of concurrent P2RANK processes
+
+        Returns:
+            dict: Results summary
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        shards = max(1, min(shards, len(pdb_files)))
+        shard_threads = max(1, threads // shards)
+        bounds = [len(pdb_files) * k // shards for k in range(shards + 1)]
+
+        jobs = []
+        for k in range(shards):
+            shard_dir = output_dir / f"shard_{k + 1}"
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            dataset_file = shard_dir / "batch_dataset.ds"
+            self.create_dataset_file(pdb_files[bounds[k]:bounds[k + 1]], dataset_file)
+            jobs.append((self.prank_command(dataset_file, shard_dir, shard_threads), shard_dir))
+
+        print(f"\nRunning P2RANK in {shards} shards ({shard_threads} threads each)...")
+        for cmd, _ in jobs:
+            print(f"Command: {' '.join(cmd)}")
+        print(f"Output: {output_dir}")
+        print(f"Logs: {output_dir / 'shard_*' / STDOUT_LOG}")
+        print()
+
+        start_time = time.time()
+
+        def run(job):
+            try:
+                return self.run_logged(*job)
+            except Exception as e:
+                return e
+
+        # Threads only wait on the JVM processes, so a thread pool is enough
+        with ThreadPoolExecutor(max_workers=shards) as executor:
+            outcomes = list(executor.map(run, jobs))
+
+        elapsed = time.time() - start_time
+
+        errors = []
+        for k, outcome in enumerate(outcomes, 1):
+            if isinstance(outcome, Exception):
+                print(f"Error running P2RANK shard {k}: {outcome}")
+                errors.append(str(outcome))
+            elif outcome.returncode != 0:
+                print(f"P2RANK shard {k} failed with error code {outcome.returncode}")
+                print(f"STDERR: {outcome.stderr}")
+                errors.append(outcome.stderr)
+
+        if errors:
+            return {
+                'success': False,
+                'error': "\n".join(errors)
+            }
+
+        print(f"P2RANK completed successfully in {elapsed:.1f}s")
+        return {
+            'success': True,
+            'elapsed': elapsed,
+            'output_dir': output_dir
+        }
+
     def collect_results(self, output_dir):
         """
-        Collect all prediction results
+        Collect all prediction results (including those in shard subdirectories)
 
         Returns:
             list: [(pdb_name, predictions_csv_path), ...]
@@ -136,7 +233,7 @@ class BatchP2RANK:
         output_dir = Path(output_dir)
         results = []
 
-        for csv_file in output_dir.glob("*_predictions.csv"):
+        for csv_file in output_dir.rglob("*_predictions.csv"):
             pdb_name = csv_file.stem.replace("_predictions", "")
             results.append((pdb_name, csv_file))
 
@@ -150,10 +247,8 @@ def find_pdb_files(input_dir, pattern="*.pdb"):
     if input_path.is_file():
         return [input_path]
 
-    pdb_files = list(input_path.glob(pattern))
-    pdb_files.extend(input_path.glob("**/" + pattern))
-
-    return sorted(set(pdb_files))
+    # One recursive walk (it also covers the top-level directory)
+    return sorted(input_path.rglob(pattern))
 
 
 def main():
@@ -168,6 +263,10 @@ Examples:
   # Process specific files from list
   python batch_p2rank.py --input-list structures.txt --output-dir results/
 
+  # Split 1000+ structures over 4 concurrent P2RANK processes
+  python batch_p2rank.py --input-dir alphafold_models/ --output-dir p2rank_results/ \\
+      --threads 8 --shards 4
+
   # Use custom P2RANK installation
   python batch_p2rank.py --input-dir models/ --output-dir results/ \\
       --p2rank-dir /path/to/p2rank_2.4.2
@@ -194,6 +293,9 @@ Examples:
                        help='Number of threads (default: 4)')
     parser.add_argument('--pattern', default='*.pdb',
                        help='File pattern for input directory (default: *.pdb)')
+    parser.add_argument('--shards', type=int, default=1,
+                       help='Run this many P2RANK processes concurrently, splitting '
+                            'the structures and threads between them (default: 1)')
 
     args = parser.parse_args()
 
@@ -229,19 +331,28 @@ Examples:
         print(f"Error: {e}")
         sys.exit(1)
 
-    # Create dataset file
-    dataset_file = Path(args.output_dir) / "batch_dataset.ds"
-    dataset_file.parent.mkdir(parents=True, exist_ok=True)
+    if args.shards > 1:
+        # Dataset files are written per shard
+        result = p2rank.run_p2rank_sharded(
+            pdb_files,
+            args.output_dir,
+            threads=args.threads,
+            shards=args.shards
+        )
+    else:
+        # Create dataset file
+        dataset_file = Path(args.output_dir) / "batch_dataset.ds"
+        dataset_file.parent.mkdir(parents=True, exist_ok=True)
 
-    p2rank.create_dataset_file(pdb_files, dataset_file)
-    print()
+        p2rank.create_dataset_file(pdb_files, dataset_file)
+        print()
 
-    # Run P2RANK
-    result = p2rank.run_p2rank(
-        dataset_file,
-        args.output_dir,
-        threads=args.threads
-    )
+        # Run P2RANK
+        result = p2rank.run_p2rank(
+            dataset_file,
+            args.output_dir,
+            threads=args.threads
+        )
 
     if not result['success']:
         print("P2RANK processing failed!")
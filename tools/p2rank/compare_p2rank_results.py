@@ -5,6 +5,7 @@ Compare P2RANK predictions with known AtUdh active sites
 
 Usage:
     python compare_p2rank_results.py <p2rank_csv_file>
+    python compare_p2rank_results.py <csv_1> <csv_2> ...   (batch summary)
 
 Where p2rank_csv_file is downloaded from PrankWeb
 
@@ -17,13 +18,35 @@ import io
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
 
 # Known AtUdh active sites (manually curated)
 KNOWN_ACTIVE_SITES = [10, 12, 34, 36, 58, 80, 102, 104, 106, 135, 137,
                       139, 161, 163, 165, 187, 189, 211, 233, 235, 257, 259]
+KNOWN_ACTIVE_SITE_SET = frozenset(KNOWN_ACTIVE_SITES)
+KNOWN_ACTIVE_SITE_ARRAY = np.array(sorted(KNOWN_ACTIVE_SITES), dtype=np.int64)
+
+# Prediction cutoffs compared in the sweep (the full list is always added)
+TOP_N_CUTOFFS = [10, 15, 20, 25, 30, 40, 50]
+
+# Batch mode writes one row per input file here
+BATCH_SUMMARY_FILE = "p2rank_comparison_summary.csv"
+
+# Accepted column names, in order of preference
+RES_NUM_COLUMNS = ['residue_number', 'ResNum', 'res_num']
+RES_NAME_COLUMNS = ['residue_name', 'ResName', 'res_name']
+SCORE_COLUMNS = ['score', 'Score', 'pocket_score']
+
+
+def first_column(df, candidates):
+    """Return the first of the candidate column names present in df, or None"""
+    return next((col for col in candidates if col in df.columns), None)
 
 
 def parse_p2rank_csv(csv_file):
@@ -33,71 +56,77 @@ def parse_p2rank_csv(csv_file):
     Expected formats:
     1. PrankWeb format: residue_number, residue_name, score
     2. P2RANK CLI format: may vary
+    3. Whitespace-separated rows without a header: res_num res_name [score]
 
     Returns:
         list: [(residue_number, residue_name, score), ...]
     """
-    predictions = []
+    text = Path(csv_file).read_text(encoding='utf-8')
+
+    # Pick the format from the first data line: comma-separated with a header,
+    # otherwise whitespace-separated "res_num res_name [score]" rows
+    first_line = next((line for line in text.splitlines()
+                       if line.strip() and not line.startswith('#')), '')
+    if ',' not in first_line:
+        return parse_whitespace_table(text)
 
     try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-
-            for row in reader:
-                # Try different column name variants
-                res_num = None
-                res_name = None
-                score = None
-
-                # Common column names
-                if 'residue_number' in row:
-                    res_num = int(row['residue_number'])
-                elif 'ResNum' in row:
-                    res_num = int(row['ResNum'])
-                elif 'res_num' in row:
-                    res_num = int(row['res_num'])
-
-                if 'residue_name' in row:
-                    res_name = row['residue_name']
-                elif 'ResName' in row:
-                    res_name = row['ResName']
-                elif 'res_name' in row:
-                    res_name = row['res_name']
-
-                if 'score' in row:
-                    score = float(row['score'])
-                elif 'Score' in row:
-                    score = float(row['Score'])
-                elif 'pocket_score' in row:
-                    score = float(row['pocket_score'])
-
-                if res_num is not None:
-                    predictions.append((res_num, res_name, score or 0.0))
-
-    except Exception as e:
+        # Read every cell as text so the conversions below behave like int()/float()
+        df = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+
+        num_col = first_column(df, RES_NUM_COLUMNS)
+        name_col = first_column(df, RES_NAME_COLUMNS)
+        score_col = first_column(df, SCORE_COLUMNS)
+
+        if num_col is None:
+            return []
+
+        res_nums = df[num_col].astype(int).tolist()
+        res_names = df[name_col].tolist() if name_col else [None] * len(df)
+        scores = df[score_col].astype(float).tolist() if score_col else [0.0] * len(df)
+
+    except ValueError as e:
         print(f"Error parsing CSV: {e}")
-        print("Trying alternative parsing...")
+        return []
 
-        # Try tab-separated or space-separated
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.startswith('#') or not line.strip():
-                    continue
+    return [(res_num, res_name, score or 0.0)
+            for res_num, res_name, score in zip(res_nums, res_names, scores)]
 
-                parts = line.strip().split()
-                if len(parts) >= 2:
-                    try:
-                        res_num = int(parts[0])
-                        res_name = parts[1] if len(parts) > 1 else "UNK"
-                        score = float(parts[2]) if len(parts) > 2 else 0.0
-                        predictions.append((res_num, res_name, score))
-                    except ValueError:
-                        continue
 
-    return predictions
+def parse_whitespace_table(text):
+    """
+    Parse whitespace-separated "res_num res_name [score]" rows
 
+    Comment lines (#) and rows whose residue number or score is not a
+    number are skipped; a missing score is 0.0.
 
-def compare_predictions(predicted, known_sites, top_n=None):
+    Returns:
+        list: [(residue_number, residue_name, score), ...]
+    """
+    lines = pd.Series(text.splitlines(), dtype=str)
+    parts = lines[~lines.str.startswith('#')].str.split(expand=True)
+    if parts.shape[1] < 2:
+        return []
+
+    scores = parts[2] if parts.shape[1] > 2 else pd.Series(None, index=parts.index, dtype=object)
+    score_values = pd.to_numeric(scores, errors='coerce')
+
+    valid = (parts[1].notna()
+             & parts[0].str.fullmatch(r'[+-]?\d+').fillna(False).astype(bool)
+             & (scores.isna() | score_values.notna()))
+    parts = parts[valid]
+
+    return list(zip(parts[0].astype(int).tolist(),
+                    parts[1].tolist(),
+                    score_values[valid].fillna(0.0).tolist()))
+
+
+def residue_numbers(predicted):
+    """Residue numbers of (res_num, res_name, score) predictions as an int array"""
+    return np.fromiter((r[0] for r in predicted), dtype=np.int64, count=len(predicted))
+
+
+def compare_predictions(predicted, known_sites, top_n=None, res_nums=None):
     """
     Compare P2RANK predictions with known active sites
 
@@ -105,52 +134,173 @@ def compare_predictions(predicted, known_sites, top_n=None):
         predicted: list of (res_num, res_name, score) tuples
         known_sites: list of known active site residue numbers
         top_n: Only consider top N predictions (None = all)
+        res_nums: residue_numbers(predicted), if already computed
 
     Returns:
         dict: Statistics
     """
+    if res_nums is None:
+        res_nums = residue_numbers(predicted)
     if top_n:
         predicted = predicted[:top_n]
+        res_nums = res_nums[:top_n]
 
-    pred_nums = [r[0] for r in predicted]
-    predicted_set = set(pred_nums)
-    known_set = set(known_sites)
+    # Sorted unique arrays, so the set operations are merges
+    pred_nums = np.unique(res_nums)
+    known = np.unique(np.asarray(known_sites, dtype=np.int64))
 
-    true_positive = predicted_set & known_set
-    false_positive = predicted_set - known_set
-    false_negative = known_set - predicted_set
+    true_positive = np.intersect1d(pred_nums, known, assume_unique=True)
+    false_positive = np.setdiff1d(pred_nums, known, assume_unique=True)
+    false_negative = np.setdiff1d(known, pred_nums, assume_unique=True)
 
-    precision = len(true_positive) / len(predicted_set) if predicted_set else 0
-    recall = len(true_positive) / len(known_set) if known_set else 0
+    precision = true_positive.size / pred_nums.size if pred_nums.size else 0
+    recall = true_positive.size / known.size if known.size else 0
     f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
 
     return {
         'predicted': predicted,
-        'true_positive': sorted(true_positive),
-        'false_positive': sorted(false_positive),
-        'false_negative': sorted(false_negative),
+        'true_positive': true_positive.tolist(),
+        'false_positive': false_positive.tolist(),
+        'false_negative': false_negative.tolist(),
         'precision': precision,
         'recall': recall,
         'f1_score': f1,
-        'n_predicted': len(predicted_set),
-        'n_known': len(known_set),
-        'n_correct': len(true_positive)
+        'n_predicted': pred_nums.size,
+        'n_known': known.size,
+        'n_correct': true_positive.size
     }
 
 
+def sweep_cutoffs(predicted, known_sites, cutoffs, res_nums=None):
+    """
+    Score the top N predictions for several cutoffs in one pass
+
+    Equivalent to calling compare_predictions once per cutoff, but the
+    per-cutoff counts come from prefix sums over the ranked predictions.
+
+    Args:
+        predicted: list of (res_num, res_name, score) tuples, best first
+        known_sites: list of known active site residue numbers
+        cutoffs: list of N values, each between 1 and len(predicted)
+        res_nums: residue_numbers(predicted), if already computed
+
+    Returns:
+        list: one dict of statistics per cutoff (without residue lists)
+    """
+    if res_nums is None:
+        res_nums = residue_numbers(predicted)
+    known = np.unique(np.asarray(known_sites, dtype=np.int64))
+
+    # A residue predicted several times counts once, at its best rank
+    _, first_index = np.unique(res_nums, return_index=True)
+    is_new = np.zeros(len(res_nums), dtype=bool)
+    is_new[first_index] = True
+    is_hit = is_new & np.isin(res_nums, known)
+
+    last = np.asarray(cutoffs, dtype=np.int64) - 1
+    n_predicted = np.cumsum(is_new)[last]
+    n_correct = np.cumsum(is_hit)[last]
+
+    precision = n_correct / n_predicted
+    recall = n_correct / known.size if known.size else np.zeros(len(last))
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros(len(last)), where=total > 0)
+
+    return [{
+        'precision': float(precision[i]),
+        'recall': float(recall[i]),
+        'f1_score': float(f1[i]),
+        'n_predicted': int(n_predicted[i]),
+        'n_known': known.size,
+        'n_correct': int(n_correct[i])
+    } for i in range(len(last))]
+
+
+def prediction_cutoffs(n_predictions):
+    """Cutoffs from TOP_N_CUTOFFS that fit, followed by all predictions"""
+    return [top_n for top_n in TOP_N_CUTOFFS + [n_predictions] if top_n <= n_predictions]
+
+
+def select_best_cutoff(cutoffs, sweep):
+    """Return (best_n, best_f1); the first cutoff wins ties, 0 if no F1 is positive"""
+    best_f1 = 0
+    best_n = 0
+    for top_n, results in zip(cutoffs, sweep):
+        if results['f1_score'] > best_f1:
+            best_f1 = results['f1_score']
+            best_n = top_n
+    return best_n, best_f1
+
+
+def analyze(csv_file):
+    """
+    Find the best prediction cutoff for one P2RANK CSV file
+
+    Args:
+        csv_file: Path to a P2RANK CSV file
+
+    Returns:
+        dict: file, best_n, best_f1 and n_correct at best_n
+    """
+    predictions = parse_p2rank_csv(csv_file)
+    summary = {'file': str(csv_file), 'best_n': 0, 'best_f1': 0.0, 'n_correct': 0}
+    if not predictions:
+        return summary
+
+    cutoffs = prediction_cutoffs(len(predictions))
+    sweep = sweep_cutoffs(predictions, KNOWN_ACTIVE_SITE_ARRAY, cutoffs)
+    best_n, best_f1 = select_best_cutoff(cutoffs, sweep)
+    if best_n:
+        summary.update(best_n=best_n, best_f1=best_f1,
+                       n_correct=sweep[cutoffs.index(best_n)]['n_correct'])
+    return summary
+
+
+def main_batch(csv_files, output_file=BATCH_SUMMARY_FILE):
+    """
+    Analyze many P2RANK CSV files in parallel and write one summary CSV
+
+    Args:
+        csv_files: List of P2RANK CSV paths
+        output_file: Path of the summary CSV
+
+    Returns:
+        pd.DataFrame: One row per input file, in input order
+    """
+    n_workers = min(os.cpu_count() or 1, len(csv_files))
+    chunksize = max(1, len(csv_files) // (n_workers * 4))
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        summary = pd.DataFrame(list(executor.map(analyze, csv_files, chunksize=chunksize)))
+
+    summary.to_csv(output_file, index=False)
+    return summary
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python compare_p2rank_results.py <p2rank_csv_file>")
+        print("Usage: python compare_p2rank_results.py <p2rank_csv_file> [<p2rank_csv_file> ...]")
         print("\nExample:")
         print("  python compare_p2rank_results.py p2rank_3rfv_results.csv")
         sys.exit(1)
 
-    csv_file = sys.argv[1]
-
-    if not Path(csv_file).exists():
-        print(f"Error: File not found: {csv_file}")
+    missing = [csv_file for csv_file in sys.argv[1:] if not Path(csv_file).exists()]
+    if missing:
+        print(f"Error: File not found: {missing[0]}")
         sys.exit(1)
 
+    if len(sys.argv) > 2:
+        summary = main_batch(sys.argv[1:])
+        print(f"{'File':<50} {'Best N':<8} {'F1-score':<10} {'Correct'}")
+        print("-" * 80)
+        for row in summary.itertuples(index=False):
+            print(f"{row.file:<50} {row.best_n:<8} {row.best_f1:>8.1%}  "
+                  f"{row.n_correct}/{len(KNOWN_ACTIVE_SITE_ARRAY)}")
+        print(f"\nSummary saved to {BATCH_SUMMARY_FILE}")
+        return
+
+    csv_file = sys.argv[1]
+
     print("="*80)
     print("P2RANK Prediction Comparison with Known AtUdh Active Sites")
     print("="*80)
@@ -179,23 +329,22 @@ def main():
     print(f"{'Top N':<10} {'Precision':<12} {'Recall':<12} {'F1-score':<12} {'Correct'}")
     print("-" * 80)
 
-    best_f1 = 0
     best_results = None
-    best_n = 0
-
-    for top_n in [10, 15, 20, 25, 30, 40, 50, len(predictions)]:
-        if top_n > len(predictions):
-            continue
 
-        results = compare_predictions(predictions, KNOWN_ACTIVE_SITES, top_n)
+    # Ranked residue numbers, shared by the sweep and the best-cutoff details
+    res_nums = residue_numbers(predictions)
+    cutoffs = prediction_cutoffs(len(predictions))
+    sweep = sweep_cutoffs(predictions, KNOWN_ACTIVE_SITE_ARRAY, cutoffs, res_nums=res_nums)
 
+    for top_n, results in zip(cutoffs, sweep):
         print(f"{top_n:<10} {results['precision']:>10.1%}  {results['recall']:>10.1%}  "
               f"{results['f1_score']:>10.1%}  {results['n_correct']}/{results['n_known']}")
 
-        if results['f1_score'] > best_f1:
-            best_f1 = results['f1_score']
-            best_results = results
-            best_n = top_n
+    best_n, best_f1 = select_best_cutoff(cutoffs, sweep)
+
+    # Residue lists are only needed for the best cutoff
+    if best_n:
+        best_results = compare_predictions(predictions, KNOWN_ACTIVE_SITE_ARRAY, best_n, res_nums=res_nums)
 
     print("-" * 80)
     print(f"Best F1-score: {best_f1:.1%} at top {best_n} predictions")
@@ -208,9 +357,10 @@ def main():
     print()
 
     print(f"Correctly predicted active sites ({len(best_results['true_positive'])}):")
+    # Best-ranked prediction per residue (filled in reverse so the first one wins)
+    pred_by_num = {p[0]: p for p in reversed(best_results['predicted'])}
     for res_num in best_results['true_positive']:
-        # Find in predictions
-        pred = next((p for p in best_results['predicted'] if p[0] == res_num), None)
+        pred = pred_by_num.get(res_num)
         if pred:
             res_name, score = pred[1], pred[2]
             print(f"  {res_num:>3} {res_name:<3}  (score: {score:.3f})")
@@ -234,9 +384,8 @@ def main():
     print(f"{'Rank':<6} {'Res':<6} {'Name':<6} {'Score':<10} {'Status'}")
     print("-" * 80)
 
-    known_set = set(KNOWN_ACTIVE_SITES)
     for i, (res_num, res_name, score) in enumerate(predictions[:30], 1):
-        status = "[*] KNOWN ACTIVE SITE" if res_num in known_set else ""
+        status = "[*] KNOWN ACTIVE SITE" if res_num in KNOWN_ACTIVE_SITE_SET else ""
         print(f"{i:<6} {res_num:<6} {res_name or 'UNK':<6} {score:>8.3f}  {status}")
 
     print("="*80)
@@ -16,13 +16,45 @@ import io
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-import csv
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
 
 # Known AtUdh active sites
 KNOWN_ACTIVE_SITES = [10, 12, 34, 36, 58, 80, 102, 104, 106, 135, 137,
                       139, 161, 163, 165, 187, 189, 211, 233, 235, 257, 259]
+KNOWN_ACTIVE_SITE_ARRAY = np.array(sorted(KNOWN_ACTIVE_SITES), dtype=np.int64)
+
+
+def parse_residue_numbers(residue_ids_str):
+    """
+    Extract residue numbers from a P2RANK residue_ids string
+
+    Tokens look like "A_109"; the number is the part after the chain ID.
+    Tokens without a chain separator or with a non-integer number are skipped.
+
+    Returns:
+        np.ndarray: sorted residue numbers
+    """
+    tokens = residue_ids_str.split()
+    if not tokens:
+        return np.empty(0, dtype=np.int64)
+
+    _, sep, rest = np.char.partition(np.array(tokens), '_').T
+    nums = np.char.partition(rest, '_')[:, 0]
+
+    # Same strings int() accepts here: an optional sign followed by digits
+    unsigned = np.char.lstrip(nums, '+-')
+    valid = ((sep == '_') & np.char.isdecimal(unsigned)
+             & (np.char.str_len(nums) - np.char.str_len(unsigned) <= 1))
+
+    residues = nums[valid].astype(np.int64)
+    # P2RANK lists residues in ascending order, so usually no sort is needed
+    if (residues[1:] < residues[:-1]).any():
+        residues.sort()
+    return residues
 
 
 def parse_p2rank_csv(csv_file):
@@ -31,71 +63,67 @@ def parse_p2rank_csv(csv_file):
 
     Returns:
         list: [(pocket_name, rank, score, residues), ...]
-        where residues is list of residue numbers
+        where residues is a sorted array of residue numbers
     """
-    pockets = []
+    try:
+        # Read every cell as text so the conversions below behave like int()/float()
+        df = pd.read_csv(csv_file, dtype=str, keep_default_na=False, encoding='utf-8')
+    except pd.errors.EmptyDataError:
+        return []
+
+    # P2RANK pads its columns with spaces: strip keys and values
+    df.columns = df.columns.str.strip()
+    df = df.apply(lambda col: col.str.strip())
+
+    n = len(df)
+    names = df['name'].tolist() if 'name' in df else ['unknown'] * n
+    ranks = df['rank'].astype(int).tolist() if 'rank' in df else [0] * n
+    scores = df['score'].astype(float).tolist() if 'score' in df else [0.0] * n
+    probabilities = df['probability'].astype(float).tolist() if 'probability' in df else [0.0] * n
+    residue_ids = df['residue_ids'].tolist() if 'residue_ids' in df else [''] * n
 
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            # Strip whitespace from keys and values
-            row = {k.strip(): v.strip() if isinstance(v, str) else v for k, v in row.items()}
-
-            pocket_name = row.get('name', 'unknown')
-            rank = int(row.get('rank', 0))
-            score = float(row.get('score', 0.0))
-            probability = float(row.get('probability', 0.0))
-
-            # Parse residue_ids: "A_109 A_110 A_111 ..."
-            residue_ids_str = row.get('residue_ids', '')
-            residues = []
-
-            for res_id in residue_ids_str.split():
-                # Format: A_109 → residue number 109
-                if '_' in res_id:
-                    parts = res_id.split('_')
-                    try:
-                        res_num = int(parts[1])
-                        residues.append(res_num)
-                    except (IndexError, ValueError):
-                        continue
-
-            pockets.append({
-                'name': pocket_name,
-                'rank': rank,
-                'score': score,
-                'probability': probability,
-                'residues': sorted(residues),
-                'n_residues': len(residues)
-            })
+    pockets = []
+    for pocket_name, rank, score, probability, residue_ids_str in zip(
+            names, ranks, scores, probabilities, residue_ids):
+        # Parse residue_ids: "A_109 A_110 A_111 ..."
+        residues = parse_residue_numbers(residue_ids_str)
+
+        pockets.append({
+            'name': pocket_name,
+            'rank': rank,
+            'score': score,
+            'probability': probability,
+            'residues': residues,
+            'n_residues': len(residues)
+        })
 
     return sorted(pockets, key=lambda x: x['rank'])
 
 
 def compare_with_known(pocket_residues, known_sites):
     """Compare pocket residues with known active sites"""
-    predicted_set = set(pocket_residues)
-    known_set = set(known_sites)
+    # Sorted unique arrays, so the set operations are merges
+    predicted = np.unique(np.asarray(pocket_residues, dtype=np.int64))
+    known = np.unique(np.asarray(known_sites, dtype=np.int64))
 
-    true_positive = predicted_set & known_set
-    false_positive = predicted_set - known_set
-    false_negative = known_set - predicted_set
+    true_positive = np.intersect1d(predicted, known, assume_unique=True)
+    false_positive = np.setdiff1d(predicted, known, assume_unique=True)
+    false_negative = np.setdiff1d(known, predicted, assume_unique=True)
 
-    precision = len(true_positive) / len(predicted_set) if predicted_set else 0
-    recall = len(true_positive) / len(known_set) if known_set else 0
+    precision = true_positive.size / predicted.size if predicted.size else 0
+    recall = true_positive.size / known.size if known.size else 0
     f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
 
     return {
-        'true_positive': sorted(true_positive),
-        'false_positive': sorted(false_positive),
-        'false_negative': sorted(false_negative),
+        'true_positive': true_positive.tolist(),
+        'false_positive': false_positive.tolist(),
+        'false_negative': false_negative.tolist(),
         'precision': precision,
         'recall': recall,
         'f1_score': f1,
-        'n_predicted': len(predicted_set),
-        'n_known': len(known_set),
-        'n_correct': len(true_positive)
+        'n_predicted': predicted.size,
+        'n_known': known.size,
+        'n_correct': true_positive.size
     }
 
 
@@ -151,7 +179,7 @@ def main():
     best_comparison = None
 
     for pocket in pockets:
-        comparison = compare_with_known(pocket['residues'], KNOWN_ACTIVE_SITES)
+        comparison = compare_with_known(pocket['residues'], KNOWN_ACTIVE_SITE_ARRAY)
 
         print(f"{pocket['name']} (Rank {pocket['rank']}, Score {pocket['score']:.2f}):")
         print(f"  Predicted: {comparison['n_predicted']} residues")
@@ -196,7 +224,7 @@ def main():
         # Combined analysis (top 2 pockets)
         if len(pockets) >= 2:
             combined_residues = set(pockets[0]['residues']) | set(pockets[1]['residues'])
-            combined_comparison = compare_with_known(list(combined_residues), KNOWN_ACTIVE_SITES)
+            combined_comparison = compare_with_known(list(combined_residues), KNOWN_ACTIVE_SITE_ARRAY)
 
             print(f"Combined Top 2 Pockets:")
             print(f"  Total residues: {len(combined_residues)}")
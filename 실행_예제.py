@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 import time
 
+OUTPUT_CHUNK_SIZE = 64 * 1024  # 자식 프로세스 출력을 한 번에 읽는 크기
+
 def ensure_test_data():
     """테스트 데이터가 없으면 생성"""
     if not Path("test_data").exists():
@@ -49,16 +51,18 @@ TER      13      VAL A   2
 END
 """
 
-    # 테스트 PDB 파일들 생성
+    # 테스트 PDB 파일들 생성 (같은 내용이므로 한 번만 인코딩)
+    pdb_bytes = pdb_content.encode('utf-8')
     for i in range(1, 3):
         pdb_file = test_dir / f"test_protein{i}.pdb"
-        pdb_file.write_text(pdb_content, encoding='utf-8')
+        pdb_file.write_bytes(pdb_bytes)
         print(f"✅ {pdb_file} 생성됨")
 
     # 2. references.txt 생성 (실제 경로 사용)
-    refs_content = f"{test_dir.absolute()}/test_protein1.pdb\n{test_dir.absolute()}/test_protein2.pdb"
+    base = test_dir.absolute()
+    refs_content = f"{base}/test_protein1.pdb\n{base}/test_protein2.pdb"
     refs_file = test_dir / "references.txt"
-    refs_file.write_text(refs_content, encoding='utf-8')
+    refs_file.write_bytes(refs_content.encode('utf-8'))
     print(f"✅ {refs_file} 생성됨")
 
     # 3. sequences.fasta 생성
@@ -75,23 +79,23 @@ MKVLWAALLVTFLAGCQAKVEQAVETEPEPELRQQTEWQSGQRWELALGRFWDYLRWVQT
 LSEQVQEELLSSQVTQELRALMDETMKELKAYKSELEEQLTPVAEELLSSQVTQELRALM
 """
     fasta_file = test_dir / "sequences.fasta"
-    fasta_file.write_text(fasta_content, encoding='utf-8')
+    fasta_file.write_bytes(fasta_content.encode('utf-8'))
     print(f"✅ {fasta_file} 생성됨")
 
     # 4. models.txt 생성
-    models_content = f"{test_dir.absolute()}/test_protein1.pdb\ttest_protein1\n{test_dir.absolute()}/test_protein2.pdb\ttest_protein1"
+    models_content = f"{base}/test_protein1.pdb\ttest_protein1\n{base}/test_protein2.pdb\ttest_protein1"
     models_file = test_dir / "models.txt"
-    models_file.write_text(models_content, encoding='utf-8')
+    models_file.write_bytes(models_content.encode('utf-8'))
     print(f"✅ {models_file} 생성됨")
 
     # 5. pocket.txt 생성 (선택사항)
-    pocket_content = f"{test_dir.absolute()}/test_protein1.pdb\tA\t1,2\n{test_dir.absolute()}/test_protein2.pdb\tA\t1,2"
+    pocket_content = f"{base}/test_protein1.pdb\tA\t1,2\n{base}/test_protein2.pdb\tA\t1,2"
     pocket_file = test_dir / "pocket.txt"
-    pocket_file.write_text(pocket_content, encoding='utf-8')
+    pocket_file.write_bytes(pocket_content.encode('utf-8'))
     print(f"✅ {pocket_file} 생성됨")
 
     print("\n📌 테스트 데이터 생성 완료!")
-    print(f"   위치: {test_dir.absolute()}")
+    print(f"   위치: {base}")
     return test_dir
 
 def run_command(cmd, description="명령어 실행 중"):
@@ -101,30 +105,25 @@ def run_command(cmd, description="명령어 실행 중"):
     print("-" * 40)
 
     try:
-        # 실시간 출력을 위해 Popen 사용
+        # 실시간 출력을 위해 Popen 사용 (stderr도 같은 파이프로 받아 순서 유지)
         process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+            stderr=subprocess.STDOUT
         )
 
-        # 실시간으로 출력 표시
+        # 실시간으로 출력 표시: 줄 단위가 아니라 읽히는 만큼 그대로 전달
+        sys.stdout.flush()
+        fd = process.stdout.fileno()
         while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
+            chunk = os.read(fd, OUTPUT_CHUNK_SIZE)
+            if not chunk:
                 break
-            if output:
-                print(output.strip())
-
-        # 남은 에러 메시지 확인
-        stderr = process.stderr.read()
-        if stderr:
-            print(f"⚠️ 경고/에러:\n{stderr}")
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        process.stdout.close()
 
-        rc = process.poll()
+        rc = process.wait()
         if rc == 0:
             print("✅ 실행 완료!")
         else:
@@ -252,6 +251,19 @@ def run_full_pipeline():
 
     return run_command(cmd, "전체 파이프라인 실행")
 
+def iter_file_sizes(dir_path, prefix=""):
+    """디렉토리 아래 모든 파일의 (상대 경로, 크기) - 한 디렉토리를 읽은 뒤 하위 디렉토리로 내려감"""
+    subdirs = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            rel_path = os.path.join(prefix, entry.name)
+            if entry.is_file():
+                yield rel_path, entry.stat().st_size
+            elif entry.is_dir():
+                subdirs.append((entry.path, rel_path))
+    for sub_path, rel_path in subdirs:
+        yield from iter_file_sizes(sub_path, rel_path)
+
 def check_outputs():
     """생성된 출력 파일들 확인"""
     print("\n" + "=" * 60)
@@ -261,18 +273,15 @@ def check_outputs():
     output_dirs = ["output_test", "output_clustering", "output_full"]
 
     for dir_name in output_dirs:
-        dir_path = Path(dir_name)
-        if dir_path.exists():
+        if os.path.isdir(dir_name):
             print(f"\n📁 {dir_name}/")
-            for file_path in dir_path.rglob("*"):
-                if file_path.is_file():
-                    size = file_path.stat().st_size
-                    print(f"  - {file_path.relative_to(dir_path)} ({size:,} bytes)")
+            for rel_path, size in iter_file_sizes(dir_name):
+                print(f"  - {rel_path} ({size:,} bytes)")
         else:
             print(f"\n❌ {dir_name}/ 디렉토리가 없습니다.")
 
-    if Path("identity_results.txt").exists():
-        print(f"\n📄 identity_results.txt ({Path('identity_results.txt').stat().st_size:,} bytes)")
+    if os.path.isfile("identity_results.txt"):
+        print(f"\n📄 identity_results.txt ({os.path.getsize('identity_results.txt'):,} bytes)")
 
 def clean_outputs():
     """출력 파일들 정리"""